@@ -0,0 +1,66 @@
+####################################################################################################
+#
+# DatasheetExtractor - A Python library to extract data from datasheet
+# Copyright (C) 2022 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""This module implements helpers to build the DataFrames returned by the table extractors.
+
+"""
+
+####################################################################################################
+
+__all__ = ['rows_to_data_frame']
+
+####################################################################################################
+
+import numpy as np
+
+import pandas as pd
+from pandas import DataFrame
+
+####################################################################################################
+
+def rows_to_data_frame(rows: list[list[str]]) -> DataFrame:
+    """Convert the rows of a table to a DataFrame like tabula-py does, i.e. the first row is the
+    header, empty cells are NaN and numeric columns are converted.
+
+    """
+    rows = [[_ if _ else np.nan for _ in row] for row in rows]
+    columns = rows.pop(0)
+    unnamed_index = 0
+    for i, column in enumerate(columns):
+        if column is np.nan:
+            columns[i] = f'Unnamed: {unnamed_index}'
+            unnamed_index += 1
+    # Avoid duplicate column name adding ".\d" as a suffix
+    counts = {}
+    for i, column in enumerate(columns):
+        count = counts.get(column, 0)
+        while count:
+            counts[column] = count + 1
+            column = f'{column}.{count}'
+            count = counts.get(column, 0)
+        columns[i] = column
+        counts[column] = count + 1
+    df = DataFrame(data=rows, columns=columns)
+    for column in df.columns:
+        try:
+            df[column] = pd.to_numeric(df[column], errors='raise')
+        except (ValueError, TypeError):
+            pass
+    return df
@@ -0,0 +1,125 @@
+####################################################################################################
+#
+# DatasheetExtractor - A Python library to extract data from datasheet
+# Copyright (C) 2022 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""This module implements the control of an extraction job running in another thread, i.e. its
+cancellation and its progress.
+
+"""
+
+####################################################################################################
+
+__all__ = ['ExtractionCancelled', 'JobControl']
+
+####################################################################################################
+
+from typing import Callable
+import logging
+import os
+import signal
+import subprocess
+import threading
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class ExtractionCancelled(Exception):
+    pass
+
+####################################################################################################
+
+class JobControl:
+
+    """This class allows to cancel an extraction job from another thread and to report its progress.
+
+    The extractor calls :meth:`check` between its steps, a subprocess registered by
+    :meth:`set_process` is killed on cancellation.
+
+    """
+
+    _logger = _module_logger.getChild('JobControl')
+
+    # interval in seconds to check the cancellation when waiting for a lock
+    POLL_INTERVAL = .1
+
+    ##############################################
+
+    def __init__(self, progress: Callable[[int], None] = None) -> None:
+        """*progress* is called with a percentage from the extraction thread"""
+        self._progress = progress
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._process = None
+
+    ##############################################
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                self._logger.info(f'Kill process {self._process.pid}')
+                self._kill(self._process)
+
+    def check(self) -> None:
+        """Raise :exc:`ExtractionCancelled` if the job was cancelled"""
+        if self._cancelled.is_set():
+            raise ExtractionCancelled
+
+    ##############################################
+
+    def progress(self, value: int) -> None:
+        if self._progress is not None:
+            self._progress(int(value))
+
+    ##############################################
+
+    def set_process(self, process: subprocess.Popen | None) -> None:
+        with self._lock:
+            self._process = process
+            if process is not None and self._cancelled.is_set():
+                self._kill(process)
+
+    @staticmethod
+    def _kill(process: subprocess.Popen) -> None:
+        # java can be a wrapper script, kill the process group if the process leads a session,
+        # cf. start_new_session
+        if os.name == 'posix':
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+                return
+            except (PermissionError, ProcessLookupError):
+                pass
+        process.kill()
+
+    ##############################################
+
+    def acquire(self, lock: threading.Lock) -> None:
+        """Acquire *lock*, but give up if the job is cancelled meanwhile"""
+        while not lock.acquire(timeout=self.POLL_INTERVAL):
+            self.check()
+        if self._cancelled.is_set():
+            lock.release()
+            raise ExtractionCancelled
@@ -0,0 +1,358 @@
+####################################################################################################
+#
+# DatasheetExtractor - A Python library to extract data from datasheet
+# Copyright (C) 2022 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""This module implements a table extractor using the text spans and the drawings of the PDF pages
+already parsed by MuPDF, it is a fast alternative to Tabula which doesn't require a JVM.
+
+Like Tabula, two modes are implemented:
+
+* the lattice mode builds the tables from the ruling lines, cf. :meth:`PdfPage.rulings`.  The
+  connected sets of rulings are the tables, the clustered coordinates of the horizontal and vertical
+  rulings give the rows and columns of the grid.  A span is placed in the cell containing its centre.
+
+* the stream mode builds the rows by grouping the spans which overlap vertically, and the columns by
+  merging the horizontal extent of the spans of the rows having several spans.  If *guess* is set,
+  the tables drawn on the page are used as table areas.
+
+The tables are returned as DataFrames with the same shape as :class:`TabulaExtractor`.
+
+Note: a span is the unit, thus cells written using a single text object cannot be split.
+
+"""
+
+####################################################################################################
+
+__all__ = ['MupdfTableExtractor']
+
+####################################################################################################
+
+from datetime import datetime
+from pathlib import Path
+import logging
+
+import numpy as np
+
+from pandas import DataFrame
+
+from DatasheetExtractor.backend.pdf.document import PdfDocument
+from DatasheetExtractor.backend.pdf.page import Direction, PdfPage
+from .data_frame import rows_to_data_frame
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+Rect = tuple[float, float, float, float]
+
+####################################################################################################
+
+def _cluster(values: np.ndarray, tolerance: float) -> np.ndarray:
+    """Return the means of the groups of sorted values distant by less than *tolerance*"""
+    if not values.size:
+        return values
+    values = np.sort(values)
+    boundaries = np.flatnonzero(np.diff(values) > tolerance) + 1
+    return np.array([_.mean() for _ in np.split(values, boundaries)])
+
+####################################################################################################
+
+def _clip_rulings(rulings: np.ndarray, area: Rect, axe: int) -> np.ndarray:
+    """Return the rulings intersecting *area* clipped to it, *axe* is 0 for horizontal rulings and
+    1 for vertical rulings.
+
+    """
+    x_min, y_min, x_max, y_max = area
+    mask = (
+        (rulings[:, 2] >= x_min) & (rulings[:, 0] <= x_max) &
+        (rulings[:, 3] >= y_min) & (rulings[:, 1] <= y_max)
+    )
+    rulings = rulings[mask].copy()
+    inf, sup = (x_min, x_max) if axe == 0 else (y_min, y_max)
+    np.clip(rulings[:, axe], inf, sup, out=rulings[:, axe])
+    np.clip(rulings[:, axe + 2], inf, sup, out=rulings[:, axe + 2])
+    return rulings
+
+####################################################################################################
+
+def _connected_rulings(
+        horizontal: np.ndarray,
+        vertical: np.ndarray,
+        tolerance: float,
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Return the sets of horizontal and vertical rulings which intersect each others"""
+    number_of_horizontals = len(horizontal)
+    # (number of horizontals, number of verticals) intersection matrix
+    x = .5*(vertical[:, 0] + vertical[:, 2])
+    y = .5*(horizontal[:, 1] + horizontal[:, 3])
+    intersections = (
+        (horizontal[:, 0, None] - tolerance <= x[None, :]) &
+        (x[None, :] <= horizontal[:, 2, None] + tolerance) &
+        (vertical[None, :, 1] - tolerance <= y[:, None]) &
+        (y[:, None] <= vertical[None, :, 3] + tolerance)
+    )
+    # union-find, verticals are numbered after the horizontals
+    parents = list(range(number_of_horizontals + len(vertical)))
+    def find(i: int) -> int:
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+    for i, j in zip(*np.nonzero(intersections)):
+        i, j = find(int(i)), find(number_of_horizontals + int(j))
+        if i != j:
+            parents[j] = i
+    components = {}
+    for i in range(len(parents)):
+        components.setdefault(find(i), []).append(i)
+    sets = []
+    for indexes in components.values():
+        indexes = np.array(indexes)
+        horizontal_indexes = indexes[indexes < number_of_horizontals]
+        vertical_indexes = indexes[indexes >= number_of_horizontals] - number_of_horizontals
+        # a table has at least one cell
+        if horizontal_indexes.size >= 2 and vertical_indexes.size >= 2:
+            sets.append((horizontal[horizontal_indexes], vertical[vertical_indexes]))
+    # sort the tables by position as Tabula
+    sets.sort(key=lambda _: (_[0][:, 1].min(), _[1][:, 0].min()))
+    return sets
+
+####################################################################################################
+
+class MupdfTableExtractor:
+
+    _logger = _module_logger.getChild('MupdfTableExtractor')
+
+    # tolerance in point to connect the rulings and to cluster the coordinates
+    TOLERANCE = 2
+
+    ##############################################
+
+    def __init__(self, document: PdfDocument | str | Path) -> None:
+        """*document* is an opened :class:`PdfDocument`, so as to share the parsed pages, or a path"""
+        if not isinstance(document, PdfDocument):
+            document = PdfDocument(document)
+        self._document = document
+
+    ##############################################
+
+    @property
+    def document(self) -> PdfDocument:
+        return self._document
+
+    ##############################################
+
+    def extract(
+            self,
+            page_number: int,
+            guess: bool = True,
+            relative_area: list[float, float, float, float] = None,
+            scaled_by_100: bool = True,
+            lattice: bool = True,
+            to_csv: bool = False,
+    ) -> list[DataFrame]:
+        """Extract the tables of a page, the parameters are the same as
+        :meth:`TabulaExtractor.extract`.
+
+        """
+        if page_number < 1:
+            raise ValueError("page must be > 1")
+        start_time = datetime.now()
+        page = self._document[page_number]
+        area = self._area(page, relative_area, scaled_by_100)
+        if lattice:
+            tables = self.extract_lattice(page, area)
+        else:
+            tables = self.extract_stream(page, area, guess)
+        _ = [rows_to_data_frame(rows) for rows in tables]
+        job_duration = datetime.now() - start_time
+        self._logger.info(f'MuPDF extraction done {job_duration}')
+        if to_csv:
+            return [_.to_csv() for _ in _]
+        else:
+            return _
+
+    ##############################################
+
+    @staticmethod
+    def _area(
+            page: PdfPage,
+            relative_area: list[float] | None,
+            scaled_by_100: bool,
+    ) -> Rect:
+        """Return the area as `x_min, y_min, x_max, y_max` in point unit"""
+        width = page.from_scaled(page.width)
+        height = page.from_scaled(page.height)
+        if not relative_area:
+            return (0, 0, width, height)
+        # top, left, bottom, right
+        top, left, bottom, right = relative_area[:4]
+        scale = 100 if scaled_by_100 else 1
+        return (left/scale*width, top/scale*height, right/scale*width, bottom/scale*height)
+
+    ##############################################
+
+    @staticmethod
+    def _spans(page: PdfPage, area: Rect, horizontal_only: bool = False) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the indexes in the span table, the centres and the bboxes in point unit of the
+        spans having their centre in *area*.
+
+        """
+        table = page.span_table()
+        bboxes = np.stack([table[_] for _ in ('x_min', 'y_min', 'x_max', 'y_max')], axis=1)
+        bboxes = bboxes.astype(np.float64) / page.UNIT_SCALE
+        centers = .5*(bboxes[:, :2] + bboxes[:, 2:])
+        x_min, y_min, x_max, y_max = area
+        mask = (
+            (x_min <= centers[:, 0]) & (centers[:, 0] <= x_max) &
+            (y_min <= centers[:, 1]) & (centers[:, 1] <= y_max)
+        )
+        if horizontal_only:
+            mask &= table['direction'] == Direction.horizontal.value
+        # skip blank spans
+        indexes = np.array([_ for _ in np.flatnonzero(mask).tolist() if table.text(_).strip()], dtype=np.int64)
+        return indexes, centers[indexes], bboxes[indexes]
+
+    ##############################################
+
+    @staticmethod
+    def _to_rows(
+            page: PdfPage,
+            indexes: np.ndarray,
+            rows: np.ndarray,
+            columns: np.ndarray,
+            shape: tuple[int, int],
+            separator: str,
+    ) -> list[list[str]]:
+        """Join the texts of the spans by cell.  Spans of the same line are concatenated, else
+        *separator* is used.
+
+        """
+        table = page.span_table()
+        cells = [[[] for _ in range(shape[1])] for _ in range(shape[0])]
+        # the span table is in reading order
+        for index, row, column in zip(indexes.tolist(), rows.tolist(), columns.tolist()):
+            cells[row][column].append(index)
+        text_rows = []
+        for row in cells:
+            text_row = []
+            for cell in row:
+                text = ''
+                line = None
+                for index in cell:
+                    span = table.array[index]
+                    span_line = (span['block'], span['line'])
+                    if line is not None and span_line != line:
+                        text += separator
+                    text += table.text(index)
+                    line = span_line
+                text_row.append(text.strip())
+            text_rows.append(text_row)
+        return text_rows
+
+    ##############################################
+
+    def _grids(self, page: PdfPage, area: Rect) -> list[tuple[np.ndarray, np.ndarray]]:
+        """Return the x and y coordinates of the grids drawn in *area*"""
+        horizontal, vertical = page.rulings()
+        horizontal = _clip_rulings(horizontal, area, 0)
+        vertical = _clip_rulings(vertical, area, 1)
+        grids = []
+        for horizontal, vertical in _connected_rulings(horizontal, vertical, self.TOLERANCE):
+            xs = _cluster(.5*(vertical[:, 0] + vertical[:, 2]), self.TOLERANCE)
+            ys = _cluster(.5*(horizontal[:, 1] + horizontal[:, 3]), self.TOLERANCE)
+            if xs.size >= 2 and ys.size >= 2:
+                grids.append((xs, ys))
+        return grids
+
+    ##############################################
+
+    def extract_lattice(self, page: PdfPage, area: Rect) -> list[list[list[str]]]:
+        """Extract the tables delimited by ruling lines in *area*, return a list of rows of strings"""
+        tables = []
+        for xs, ys in self._grids(page, area):
+            grid_area = (xs[0], ys[0], xs[-1], ys[-1])
+            indexes, centers, _ = self._spans(page, grid_area)
+            if not indexes.size:
+                # a box without text
+                continue
+            shape = (ys.size - 1, xs.size - 1)
+            rows = np.clip(np.searchsorted(ys, centers[:, 1], side='right') - 1, 0, shape[0] - 1)
+            columns = np.clip(np.searchsorted(xs, centers[:, 0], side='right') - 1, 0, shape[1] - 1)
+            # Tabula joins the lines of a cell using a carriage return
+            tables.append(self._to_rows(page, indexes, rows, columns, shape, '\r'))
+        return tables
+
+    ##############################################
+
+    def extract_stream(self, page: PdfPage, area: Rect, guess: bool = True) -> list[list[list[str]]]:
+        """Extract the tables in *area* using the text alignment, return a list of rows of strings.
+
+        If *guess* is set, the grids drawn in *area* are used as table areas.
+
+        """
+        areas = None
+        if guess:
+            areas = [(xs[0], ys[0], xs[-1], ys[-1]) for xs, ys in self._grids(page, area)]
+        if not areas:
+            areas = [area]
+        tables = []
+        for area in areas:
+            indexes, centers, bboxes = self._spans(page, area, horizontal_only=True)
+            if not indexes.size:
+                continue
+            # group the spans which overlap vertically
+            order = np.argsort(bboxes[:, 1], kind='stable')
+            rows = np.zeros(indexes.size, dtype=np.int64)
+            row = -1
+            row_y_max = None
+            for i in order.tolist():
+                y_min, y_max = bboxes[i, 1], bboxes[i, 3]
+                if row_y_max is None or y_min >= row_y_max - .5*(y_max - y_min):
+                    row += 1
+                    row_y_max = y_max
+                else:
+                    row_y_max = max(row_y_max, y_max)
+                rows[i] = row
+            number_of_rows = row + 1
+            # merge the horizontal extent of the spans of the rows having several spans,
+            # a title or a note would merge all the columns
+            counts = np.bincount(rows, minlength=number_of_rows)
+            mask = counts[rows] >= 2
+            if not mask.any():
+                mask[:] = True
+            intervals = bboxes[mask][:, (0, 2)]
+            intervals = intervals[np.argsort(intervals[:, 0], kind='stable')]
+            starts = [intervals[0, 0]]
+            stop = intervals[0, 1]
+            for x_min, x_max in intervals[1:].tolist():
+                if x_min > stop + self.TOLERANCE:
+                    starts.append(x_min)
+                    stop = x_max
+                else:
+                    stop = max(stop, x_max)
+            starts = np.array(starts)
+            shape = (number_of_rows, starts.size)
+            columns = np.clip(np.searchsorted(starts, centers[:, 0], side='right') - 1, 0, shape[1] - 1)
+            # spans are placed in reading order in the cells
+            order = np.argsort(indexes, kind='stable')
+            tables.append(self._to_rows(page, indexes[order], rows[order], columns[order], shape, ' '))
+        return tables
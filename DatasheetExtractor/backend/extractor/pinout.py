@@ -53,7 +53,7 @@ class PinoutExtractor:
         # pprint(ys)
 
         pins = {}
-        for y in ys.values():
+        for y in ys:
             if len(y) == 4:
                 parts = [_.text for _ in y]
                 int_count = 0
@@ -81,6 +81,13 @@ class PinoutExtractor:
 
     ##############################################
 
+    @classmethod
+    def page_pinout_quad(cls, page: PdfPage) -> dict:
+        """Extract the pinout of a page, cf. :meth:`PdfDocument.map_pages`"""
+        return cls(page).extract_pinout_quad()
+
+    ##############################################
+
     @staticmethod
     def format_pinout(pins: dict) -> str:
         text = ''
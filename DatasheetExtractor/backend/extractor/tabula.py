@@ -28,29 +28,185 @@ The lattice mode use an algorithm from <Anssi Nurminen's master's
 thesis`http://dspace.cc.tut.fi/dpub/bitstream/handle/123456789/21520/Nurminen.pdf?sequence=3`>_.  It
 find cells by image processing.
 
+`tabula.read_pdf` starts a Java process or calls the Java command line application for each call,
+and parses the PDF again.  If `JPype <https://jpype.readthedocs.io>`_ is installed, the extractor
+starts a JVM once in the Python process and calls the tabula-java API directly, the document is kept
+open and its pages are parsed once.
+
 """
 
 ####################################################################################################
 
-__all__ = ['TabulaExtractor']
+__all__ = ['TabulaExtractor', 'TabulaJob']
 
 ####################################################################################################
 
-import logging
 from datetime import datetime
 from pathlib import Path
+import json
+import os
+import subprocess
+from typing import Iterable, NamedTuple
+import logging
+import threading
 
-import tabula
+from tabula.backend import JAVA_NOT_FOUND_ERROR, jar_path
+from tabula.errors import JavaNotFoundError
+from tabula.util import TabulaOption
 
 # https://pandas.pydata.org/docs/reference/api/pandas.DataFrame.html
 from pandas import DataFrame
 
+try:
+    import jpype
+except ImportError:
+    jpype = None
+
+from .data_frame import rows_to_data_frame
+from .job_control import JobControl
+from .tabula_cache import TabulaResultCache
+
 ####################################################################################################
 
 _module_logger = logging.getLogger(__name__)
 
 ####################################################################################################
 
+_jvm_lock = threading.Lock()
+
+def _start_jvm() -> None:
+    """Start the JVM once for the process, a JVM cannot be restarted."""
+    with _jvm_lock:
+        if not jpype.isJVMStarted():
+            _module_logger.info('Start JVM...')
+            start_time = datetime.now()
+            jpype.addClassPath(jar_path())
+            jpype.startJVM(
+                # silent
+                '-Dorg.slf4j.simpleLogger.defaultLogLevel=off',
+                '-Dorg.apache.commons.logging.Log=org.apache.commons.logging.impl.NoOpLog',
+                convertStrings=False,
+            )
+            _module_logger.info(f'JVM started {datetime.now() - start_time}')
+
+####################################################################################################
+
+class TabulaDocument:
+
+    """This class implements a PDF document opened in the JVM using the tabula-java API.
+
+    The methods are thread safe, but the calls are serialised since PDFBox is not thread safe.
+
+    """
+
+    _logger = _module_logger.getChild('TabulaDocument')
+
+    ##############################################
+
+    def __init__(self, path: str | Path) -> None:
+        _start_jvm()
+        self._path = Path(path)
+        self._lock = threading.Lock()
+        File = jpype.JClass('java.io.File')
+        PDDocument = jpype.JClass('org.apache.pdfbox.pdmodel.PDDocument')
+        self._logger.info(f'Open {self._path}')
+        self._document = PDDocument.load(File(str(self._path)))
+        self._extractor = jpype.JClass('technology.tabula.ObjectExtractor')(self._document)
+        self._pages = {}
+
+    ##############################################
+
+    def close(self) -> None:
+        with self._lock:
+            if self._document is not None:
+                self._extractor.close()
+                self._document = None
+                self._pages.clear()
+
+    ##############################################
+
+    def _page(self, page_number: int):
+        # a page is parsed once
+        page = self._pages.get(page_number)
+        if page is None:
+            page = self._extractor.extract(int(page_number))
+            self._pages[page_number] = page
+        return page
+
+    ##############################################
+
+    def extract(
+            self,
+            page_number: int,
+            area: tuple[float, float, float, float] = None,
+            guess: bool = True,
+            lattice: bool = True,
+            control: JobControl = None,
+    ) -> list[list[list[str]]]:
+        """Extract the tables of a page, *area* is given as top, left, bottom, right in percent of
+        the page size.  Return a list of tables as rows of strings.
+
+        The Java calls cannot be interrupted, a cancelled job is aborted between them.
+
+        """
+        extractors = jpype.JPackage('technology').tabula.extractors
+        detectors = jpype.JPackage('technology').tabula.detectors
+        if control is None:
+            control = JobControl()
+        # don't wait for the previous jobs if cancelled
+        control.acquire(self._lock)
+        try:
+            page = self._page(page_number)
+            control.check()
+            control.progress(50)
+            if area is not None:
+                top, left, bottom, right = area
+                height = float(page.getHeight())
+                width = float(page.getWidth())
+                page = page.getArea(
+                    top / 100 * height,
+                    left / 100 * width,
+                    bottom / 100 * height,
+                    right / 100 * width,
+                )
+            if lattice:
+                algorithm = extractors.SpreadsheetExtractionAlgorithm()
+            else:
+                algorithm = extractors.BasicExtractionAlgorithm()
+            # as the command line application, guess is disabled when an area is given and the
+            # areas are only guessed in stream mode
+            if guess and area is None and not lattice:
+                detector = detectors.NurminenDetectionAlgorithm()
+                pages = [page.getArea(_) for _ in detector.detect(page)]
+            else:
+                pages = [page]
+            tables = []
+            for page in pages:
+                control.check()
+                for table in algorithm.extract(page):
+                    rows = [[str(cell.getText()) for cell in row] for row in table.getRows()]
+                    if rows:
+                        tables.append(rows)
+            return tables
+        finally:
+            self._lock.release()
+
+####################################################################################################
+
+class TabulaJob(NamedTuple):
+
+    """An extraction job for :meth:`TabulaExtractor.extract_batch`, *relative_area* is top, left,
+    bottom, right in percent of the page size or :obj:`None` for the whole page.
+
+    """
+
+    page_number: int
+    relative_area: tuple[float, float, float, float] | None = None
+    lattice: bool = True
+    guess: bool = False
+
+####################################################################################################
+
 class TabulaExtractor:
 
     _logger = _module_logger.getChild('TabulaExtractor')
@@ -63,8 +219,82 @@ class TabulaExtractor:
 
     ##############################################
 
-    def __init__(self, path: str | Path) -> None:
+    CACHE_DIRECTORY = 'tabula-cache'
+
+    ##############################################
+
+    def __init__(
+            self,
+            path: str | Path,
+            persistent: bool = True,
+            cache_path: str | Path = None,
+            content_hash: str = None,
+    ) -> None:
+        """If *persistent* is set and JPype is available, the document is kept open in a JVM
+        running in the process, cf. :class:`TabulaDocument`, else a Java process is run per extraction.
+
+        If *cache_path* is set, the extracted tables are stored under this path and reused by the
+        following extractions of the same page, area and mode.  *content_hash* is the SHA-256 of
+        the file if already known, cf. :attr:`PdfDocument.content_hash`.
+
+        """
         self._path = Path(path)
+        self._persistent = persistent and jpype is not None
+        if cache_path is not None:
+            # the backends can give different results
+            backend = 'jvm' if self._persistent else 'cli'
+            self._cache = TabulaResultCache(
+                Path(cache_path).joinpath(self.CACHE_DIRECTORY),
+                self._path,
+                # invalidate on Tabula update
+                tag=f'{Path(jar_path()).stem}-{backend}',
+                content_hash=content_hash,
+            )
+        else:
+            self._cache = None
+        self._document = None
+        self._lock = threading.Lock()
+        if persistent and jpype is None:
+            self._logger.warning('JPype is not available, use a Java process per extraction')
+
+    ##############################################
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def cache(self) -> TabulaResultCache:
+        return self._cache
+
+    @property
+    def document(self) -> TabulaDocument:
+        # extractions can run concurrently in a thread pool
+        with self._lock:
+            if self._document is None:
+                self._document = TabulaDocument(self._path)
+            return self._document
+
+    def close(self) -> None:
+        with self._lock:
+            if self._document is not None:
+                self._document.close()
+                self._document = None
+
+    ##############################################
+
+    @staticmethod
+    def _area(
+            relative_area: Iterable[float] | None,
+            scaled_by_100: bool = True,
+    ) -> list[float] | None:
+        if relative_area:
+            # top, left, bottom, right
+            area = list(relative_area[:4])
+            if not scaled_by_100:
+                area = [100*_ for _ in area]
+            return area
+        return None
 
     ##############################################
 
@@ -76,45 +306,153 @@ class TabulaExtractor:
             scaled_by_100: bool = True,
             lattice: bool = True,
             to_csv: bool = False,
+            control: JobControl = None,
     ) -> list[DataFrame]:
+        """*control* allows to cancel the extraction from another thread, cf. :class:`JobControl`"""
         if page_number < 1:
             raise ValueError("page must be > 1")
-        kwargs = {}
-        if relative_area:
-            # top, left, bottom, right
-            area = relative_area[:4]
-            if not scaled_by_100:
-                area = [100*_ for _ in area]
-            kwargs['area'] = area
-        # https://tabula-py.readthedocs.io/en/latest/tabula.html#tabula.io.read_pdf
-        self._logger.info('Start Tabula.java process...')
+        if control is None:
+            control = JobControl()
+        area = self._area(relative_area, scaled_by_100)
         start_time = datetime.now()
-        _ = tabula.read_pdf(
-            input_path=str(self._path),
-            output_format='dataframe',   # json
-            encoding='utf-8',
-            # java_options='',
-            # pandas_options='',
-            multiple_tables=True,
-            # user_agent
-            # use_raw_url
+        _ = self._extract(page_number, area, guess, lattice, control)
+        control.progress(100)
+        job_duration = datetime.now() - start_time
+        self._logger.info(f'Tabula extraction done {job_duration}')
+        if to_csv:
+            return [_.to_csv() for _ in _]
+        else:
+            return _
+
+    ##############################################
+
+    def extract_batch(
+            self,
+            jobs: Iterable[TabulaJob],
+            scaled_by_100: bool = True,
+            to_csv: bool = False,
+            control: JobControl = None,
+    ) -> dict[TabulaJob, list[DataFrame]]:
+        """Run a list of extraction jobs and return the tables keyed by job.
+
+        With the JPype backend, the jobs share the JVM and the parsed document, each page is parsed
+        once whatever the number of areas extracted from it.  Batching only helps this backend:
+        without JPype, each job still starts a Java process, since the JSON output of tabula-java
+        doesn't tell the page of a table and the results of a single process cannot be dispatched
+        reliably to the jobs.  Cached results, if any, are reused in both cases.
+
+        The progress is the percentage of done jobs.
+
+        """
+        jobs = [TabulaJob(*_) for _ in jobs]
+        # make the area hashable
+        jobs = [
+            _._replace(relative_area=tuple(_.relative_area) if _.relative_area else None)
+            for _ in jobs
+        ]
+        for job in jobs:
+            if job.page_number < 1:
+                raise ValueError("page must be > 1")
+        if control is None:
+            control = JobControl()
+        if not self._persistent:
+            # cf. docstring
+            self._logger.warning('JPype is not available, use a Java process per job')
+        results = {}
+        start_time = datetime.now()
+        # group the jobs by page
+        jobs = sorted(set(jobs), key=lambda _: _.page_number)
+        for i, job in enumerate(jobs):
+            control.check()
+            area = self._area(job.relative_area, scaled_by_100)
+            _ = self._extract(job.page_number, area, job.guess, job.lattice, control)
+            if to_csv:
+                _ = [_.to_csv() for _ in _]
+            results[job] = _
+            control.progress(100 * (i + 1) // len(jobs))
+        job_duration = datetime.now() - start_time
+        self._logger.info(f'Tabula batch of {len(results)} jobs done {job_duration}')
+        return results
+
+    ##############################################
+
+    def _extract(
+            self,
+            page_number: int,
+            area: list[float, float, float, float] | None,
+            guess: bool,
+            lattice: bool,
+            control: JobControl,
+    ) -> list[DataFrame]:
+        if self._cache is not None:
+            tables = self._cache.get(page_number, area, guess, lattice)
+            if tables is not None:
+                return tables
+        if self._persistent:
+            tables = self.document.extract(page_number, area, guess, lattice, control)
+        else:
+            tables = self._run_java(page_number, area, guess, lattice, control)
+        tables = [rows_to_data_frame(rows) for rows in tables]
+        if self._cache is not None:
+            self._cache.set(page_number, area, guess, lattice, tables)
+        return tables
+
+    ##############################################
+
+    # Same as tabula-py silent option
+    JAVA_OPTIONS = (
+        '-Dfile.encoding=UTF8',
+        '-Dorg.slf4j.simpleLogger.defaultLogLevel=off',
+        '-Dorg.apache.commons.logging.Log=org.apache.commons.logging.impl.NoOpLog',
+    )
+
+    def _run_java(
+            self,
+            page_number: int,
+            area: list[float, float, float, float] | None,
+            guess: bool,
+            lattice: bool,
+            control: JobControl,
+    ) -> list[list[list[str]]]:
+        # tabula.read_pdf runs the process using subprocess.run, thus it cannot be killed,
+        # we run the command line application as tabula-py does
+        # https://tabula-py.readthedocs.io/en/latest/tabula.html#tabula.io.read_pdf
+        options = TabulaOption(
             pages=int(page_number),
             guess=guess,
+            area=area,
             relative_area=True,
             lattice=lattice,
             stream=not lattice,
-            # password
-            # silent
-            # columns
-            # format
-            # batch
-            # output_path
-            # options
-            **kwargs,
+            format='JSON',
+            silent=True,
         )
-        job_duration = datetime.now() - start_time
-        self._logger.info(f'Tabula process done {job_duration}')
-        if to_csv:
-            return [_.to_csv() for _ in _]
-        else:
-            return _
+        args = ['java', *self.JAVA_OPTIONS, '-jar', jar_path(), *options.build_option_list(), str(self._path)]
+        control.check()
+        self._logger.info('Start Tabula.java process...')
+        try:
+            process = subprocess.Popen(
+                args,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                stdin=subprocess.DEVNULL,
+                # so as to kill the children of a wrapper script
+                start_new_session=os.name == 'posix',
+            )
+        except FileNotFoundError:
+            raise JavaNotFoundError(JAVA_NOT_FOUND_ERROR)
+        control.set_process(process)
+        try:
+            stdout, stderr = process.communicate()
+        finally:
+            control.set_process(None)
+        control.check()
+        if process.returncode:
+            self._logger.error(f"Error from tabula-java:\n{stderr.decode('utf-8')}")
+            raise subprocess.CalledProcessError(process.returncode, args, stdout, stderr)
+        tables = []
+        for table in json.loads(stdout.decode('utf-8')):
+            rows = [[cell['text'] for cell in row] for row in table['data']]
+            if rows:
+                tables.append(rows)
+        return tables
@@ -0,0 +1,195 @@
+####################################################################################################
+#
+# DatasheetExtractor - A Python library to extract data from datasheet
+# Copyright (C) 2022 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""This module implements a persistent cache for the tables extracted by Tabula.
+
+Entries are stored in a directory named after the SHA-256 of the PDF file, one directory per page,
+area and extraction mode, which contains one Parquet file per table.  An empty directory means no
+table was found.  The area is rounded so as to match a selection which differs by a fraction of a
+point.
+
+Parquet requires `pyarrow <https://arrow.apache.org/docs/python>`_, the cache is disabled if it is
+not installed.
+
+"""
+
+####################################################################################################
+
+__all__ = ['TabulaResultCache']
+
+####################################################################################################
+
+from pathlib import Path
+import logging
+import os
+import shutil
+import threading
+
+import pandas as pd
+from pandas import DataFrame
+
+from DatasheetExtractor.common.PathTools import file_hash
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class TabulaResultCache:
+
+    _logger = _module_logger.getChild('TabulaResultCache')
+
+    # Increment when the format changes
+    VERSION = 1
+
+    SUFFIX = '.parquet'
+    # decimals in percent of the page size
+    AREA_DECIMALS = 1
+
+    ##############################################
+
+    def __init__(
+            self,
+            path: str | Path,
+            pdf_path: str | Path,
+            tag: str = '',
+            content_hash: str = None,
+    ) -> None:
+        """*tag* identifies the extractor, e.g. its backend and version, and is part of the key.
+
+        *content_hash* is the SHA-256 of the PDF file if it is already known, e.g.
+        :attr:`PdfDocument.content_hash`, else it is computed on first use.
+
+        """
+        self._path = Path(path)
+        self._pdf_path = Path(pdf_path)
+        self._tag = tag
+        self._content_hash = content_hash
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        try:
+            import pyarrow
+            self._enabled = True
+        except ImportError:
+            self._logger.warning('pyarrow is not available, the Tabula cache is disabled')
+            self._enabled = False
+
+    ##############################################
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @property
+    def content_hash(self) -> str:
+        """SHA-256 of the PDF file"""
+        with self._lock:
+            if self._content_hash is None:
+                self._content_hash = file_hash(self._pdf_path)
+            return self._content_hash
+
+    ##############################################
+
+    @classmethod
+    def normalize_area(cls, area: list[float] | None) -> tuple[float, ...] | None:
+        if area is None:
+            return None
+        return tuple(round(float(_), cls.AREA_DECIMALS) for _ in area)
+
+    ##############################################
+
+    def _entry_path(
+            self,
+            page_number: int,
+            area: list[float] | None,
+            guess: bool,
+            lattice: bool,
+    ) -> Path:
+        area = self.normalize_area(area)
+        if area is None:
+            area_name = 'page'
+        else:
+            area_name = '_'.join(f'{_:.{self.AREA_DECIMALS}f}' for _ in area)
+        mode = 'lattice' if lattice else 'stream'
+        if guess:
+            mode += '-guess'
+        name = f'{page_number:05}-{area_name}-{mode}-{self._tag}-v{self.VERSION}'
+        return self._path.joinpath(self.content_hash, name)
+
+    ##############################################
+
+    def get(
+            self,
+            page_number: int,
+            area: list[float] | None,
+            guess: bool,
+            lattice: bool,
+    ) -> list[DataFrame] | None:
+        """Return the tables or :obj:`None` if not cached"""
+        if not self._enabled:
+            return None
+        path = self._entry_path(page_number, area, guess, lattice)
+        if not path.is_dir():
+            self.misses += 1
+            self._logger.info(f"Miss page {page_number} area {area}")
+            return None
+        try:
+            tables = [pd.read_parquet(_) for _ in sorted(path.glob(f'*{self.SUFFIX}'))]
+        except (OSError, ValueError) as exception:
+            self.misses += 1
+            self._logger.warning(f"Invalid cache entry {path}: {exception}")
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        self.hits += 1
+        self._logger.info(f"Hit page {page_number} area {area}")
+        return tables
+
+    ##############################################
+
+    def set(
+            self,
+            page_number: int,
+            area: list[float] | None,
+            guess: bool,
+            lattice: bool,
+            tables: list[DataFrame],
+    ) -> None:
+        if not self._enabled:
+            return
+        path = self._entry_path(page_number, area, guess, lattice)
+        # write then rename so as a concurrent reader never sees a partial entry
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}-{threading.get_ident()}.tmp')
+        try:
+            tmp_path.mkdir(parents=True, exist_ok=True)
+            for i, table in enumerate(tables):
+                # Parquet requires string column names
+                table = table.rename(columns=str)
+                table.to_parquet(tmp_path.joinpath(f'{i:03}{self.SUFFIX}'))
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        except (OSError, ValueError, TypeError) as exception:
+            self._logger.warning(f"Cannot write cache entry {path}: {exception}")
+            shutil.rmtree(tmp_path, ignore_errors=True)
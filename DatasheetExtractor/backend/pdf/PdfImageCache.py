@@ -20,9 +20,30 @@
 
 ####################################################################################################
 
-import numpy as np
+"""This module implements a cache for the pixmaps rendered from the PDF pages.
 
-from DatasheetExtractor.common.LruCache import LruCache
+"""
+
+####################################################################################################
+
+__all__ = ['PdfImageCache']
+
+####################################################################################################
+
+from typing import Iterable, Optional
+import logging
+
+# https://github.com/pymupdf/PyMuPDF
+import fitz
+
+from IntervalArithmetic import IntervalInt2D
+
+from DatasheetExtractor.common.LruCache import Cache, EvictionPolicy, GdsfPolicy
+from .image_disk_cache import PdfImageDiskCache
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
 
 ####################################################################################################
 
@@ -30,7 +51,7 @@ class Image:
 
     ##############################################
 
-    def __init__(self, key: str, pixmap: np.ndarray) -> None:
+    def __init__(self, key: str, pixmap: fitz.Pixmap) -> None:
         self._key = key
         self.pixmap = pixmap
 
@@ -42,22 +63,224 @@ class Image:
     ##############################################
 
     def size(self) -> int:
-        return self.pixmap.nbytes
+        return self.pixmap.stride * self.pixmap.height
 
 ####################################################################################################
 
 class PdfImageCache:
 
-    # Fixme: __XXX__
-    antialiasing_level = 8
-    cache_size = 128 * 1024 # Fixme: MB
+    """This class implements a cache for the pixmaps rendered from the pages of a document.
+
+    Entries are keyed by the page number and the render parameters, cf. :meth:`PdfPage.pixmap`.
+    Pixmaps are shared and must not be modified.
+
+    An entry can be pinned using :meth:`acquire` so as it is not recycled until :meth:`release` is
+    called.
+
+    The default eviction policy is :class:`GdsfPolicy` since the size of the pixmaps spans several
+    orders of magnitude, from thumbnails to high resolution renders: it keeps the small and
+    frequently reused pixmaps rather than a single large one.
+
+    If a *disk_cache* is given, it is used as a second tier: rendered pixmaps are written to it and
+    a miss in memory is looked up on disk before to render the page.
+
+    """
+
+    _logger = _module_logger.getChild('PdfImageCache')
+
+    # None to use the MuPDF global level, cf. PdfPage.pixmap
+    antialiasing_level = None
+    CACHE_SIZE = 128 * 1024**2   # bytes
 
     ##############################################
 
-    def __init__(self, document, cache_size=cache_size):
+    def __init__(
+            self,
+            document,
+            cache_size=CACHE_SIZE,
+            policy: Optional[EvictionPolicy] = None,
+            disk_cache: Optional[PdfImageDiskCache] = None,
+    ):
 
-        self._lru_cache = LruCache(constraint=cache_size)
+        if policy is None:
+            policy = GdsfPolicy()
+        self._cache = Cache(constraint=cache_size, policy=policy)
         self._document = document
+        self._disk_cache = disk_cache
+        self.reset_statistics()
+
+    ##############################################
+
+    @property
+    def cache_size(self) -> int:
+        return self._cache.constraint
+
+    @cache_size.setter
+    def cache_size(self, value: int) -> None:
+        self._cache.constraint = value
+
+    @property
+    def usage(self) -> int:
+        return self._cache.size()
+
+    @property
+    def disk_cache(self) -> Optional[PdfImageDiskCache]:
+        return self._disk_cache
+
+    ##############################################
+
+    def reset_statistics(self) -> None:
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions_offset = self._cache.number_of_evictions
+
+    @property
+    def _evictions(self) -> int:
+        return self._cache.number_of_evictions - self._evictions_offset
+
+    @property
+    def statistics(self) -> dict:
+        """Return the number of hits, disk hits, misses and evictions"""
+        return dict(
+            hits=self._hits,
+            disk_hits=self._disk_hits,
+            misses=self._misses,
+            evictions=self._evictions,
+        )
+
+    def __str__(self) -> str:
+        return (
+            f'Image cache: {self._hits} hits, {self._disk_hits} disk hits, {self._misses} misses, '
+            f'{self._evictions} evictions, {self.usage} / {self.cache_size} bytes'
+        )
+
+    ##############################################
+
+    @staticmethod
+    def _clip_key(clip: Optional[IntervalInt2D | Iterable[float]]) -> Optional[tuple[float, ...]]:
+        if clip is None:
+            return None
+        if isinstance(clip, IntervalInt2D):
+            clip = clip.bounding_box
+        return tuple(float(_) for _ in clip)
+
+    ##############################################
+
+    def _get(
+            self,
+            page_number: int,
+            acquire: bool,
+            keep: bool = True,
+            dpi: int = 72,
+            clip: Optional[IntervalInt2D | Iterable[float]] = None,
+            alpha: bool = False,
+            rotation: int = 0,
+            width: Optional[int] = None,
+            height: Optional[int] = None,
+            fit: bool = False,
+    ) -> Image:
+        clip = self._clip_key(clip)
+        key = '-'.join([str(x) for x in (
+            page_number,
+            dpi, clip, alpha,
+            rotation, width, height, fit,
+            self.antialiasing_level,
+        )])
+        if acquire:
+            obj = self._cache.acquire(key)
+        else:
+            obj = self._cache.get(key)
+        if obj is not None:
+            self._hits += 1
+            return obj
+        pixmap = None
+        if self._disk_cache is not None:
+            pixmap = self._disk_cache.get(key)
+        if pixmap is not None:
+            self._disk_hits += 1
+        else:
+            self._misses += 1
+            pixmap = self._render(page_number, key, dpi, clip, alpha, rotation, width, height, fit)
+        obj = Image(key, pixmap)
+        if keep:
+            self._cache.add(obj, acquire)
+        return obj
+
+    ##############################################
+
+    def _render(
+            self,
+            page_number: int,
+            key: str,
+            dpi: int,
+            clip: Optional[tuple[float, ...]],
+            alpha: bool,
+            rotation: int,
+            width: Optional[int],
+            height: Optional[int],
+            fit: bool,
+    ) -> fitz.Pixmap:
+        page = self._document[page_number]
+        pixmap = page.pixmap(
+            dpi=dpi,
+            alpha=alpha,
+            clip=clip,
+            rotation=rotation,
+            width=width,
+            height=height,
+            fit=fit,
+            antialiasing_level=self.antialiasing_level,
+        )
+        if self._disk_cache is not None:
+            # write through so as the disk tier survives the process without a flush
+            self._disk_cache.set(key, pixmap)
+        return pixmap
+
+    ##############################################
+
+    def acquire(self, page_number: int, **kwargs) -> Image:
+        """Return the pinned cache entry, cf. :meth:`pixmap` for the parameters.  The entry must be
+        released using :meth:`release`.
+
+        """
+        return self._get(page_number, True, **kwargs)
+
+    def release(self, image: Image) -> None:
+        """Release an entry returned by :meth:`acquire`"""
+        self._cache.release(image.key())
+
+    ##############################################
+
+    def pixmap(self, page_number: int, **kwargs) -> fitz.Pixmap:
+        """Return the pixmap of a page, cf. :meth:`PdfPage.pixmap` for the parameters.
+
+        Pixmaps are rendered from the page display list and are cached.
+
+        """
+        return self._get(page_number, False, **kwargs).pixmap
+
+    ##############################################
+
+    def render(self, page_number: int, **kwargs) -> fitz.Pixmap:
+        """Same as :meth:`pixmap` but the pixmap is not added to the memory tier, for a caller which
+        keeps the images in its own cache, e.g. a GUI.  The disk tier is used.
+
+        """
+        return self._get(page_number, False, keep=False, **kwargs).pixmap
+
+    ##############################################
+
+    def pixmaps(self, page_number: int, dpis: Iterable[int], **kwargs) -> list[fitz.Pixmap]:
+        """Return the pixmaps of a page at several resolutions, missing renders share the page
+        display list.
+
+        """
+        # pin the entries so as a render cannot recycle a previous one
+        images = [self.acquire(page_number, dpi=_, **kwargs) for _ in dpis]
+        for _ in images:
+            self.release(_)
+        return [_.pixmap for _ in images]
 
     ##############################################
 
@@ -66,24 +289,12 @@ class PdfImageCache:
                   rotation=0,
                   resolution=72,
                   width=None, height=None, fit=False,
-                 ):
-
-        key = '-'.join([str(x) for x in (page_index,
-                                         rotation,
-                                         resolution,
-                                         width, height, fit,
-                                         self.antialiasing_level)])
-
-        obj = self._lru_cache.acquire(key)
-        if obj is not None:
-            return obj.pixmap
-        else:
-            page = self._document[page_index]
-            pixmap = page.to_pixmap(rotation,
-                                    resolution,
-                                    width, height, fit,
-                                    self.antialiasing_level,
-                                   )
-            obj = Image(key, pixmap)
-            self._lru_cache.add(obj)
-            return pixmap
+                 ) -> fitz.Pixmap:
+        return self.pixmap(
+            page_index,
+            dpi=resolution,
+            rotation=rotation,
+            width=width,
+            height=height,
+            fit=fit,
+        )
@@ -24,11 +24,14 @@ __all__ = ['PdfDocument']
 
 ####################################################################################################
 
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Iterator, Optional
+from typing import Any, Callable, Iterable, Iterator, Optional
 from urllib.parse import urlparse
 
 import logging
+import os
+import threading
 
 import requests
 
@@ -39,6 +42,10 @@ import fitz
 
 from .page import PdfPage
 from .PdfImageCache import PdfImageCache
+from .image_disk_cache import PdfImageDiskCache
+from .text_cache import PdfTextCache
+from DatasheetExtractor.common.LruCache import LruCache
+from DatasheetExtractor.common.PathTools import file_hash
 # from DatasheetExtractor.commmon.AttributeDictionaryInterface import ReadOnlyAttributeDictionaryInterface
 
 ####################################################################################################
@@ -47,12 +54,39 @@ _module_logger = logging.getLogger(__name__)
 
 ####################################################################################################
 
+# Document opened by a process pool worker, cf. PdfDocument.map_pages
+_worker_document = None
+
+def _init_map_pages_worker(path: str, cache_path: str, text_cache: bool) -> None:
+    global _worker_document
+    _worker_document = PdfDocument(path, cache_path=cache_path, text_cache=text_cache)
+
+def _map_pages_job(func: Callable, page_numbers: list[int], document: 'PdfDocument' = None) -> list:
+    if document is None:
+        document = _worker_document
+    results = []
+    for page_number in page_numbers:
+        page = document._load_page(page_number)
+        try:
+            results.append(func(page))
+        finally:
+            page.release()
+    return results
+
+####################################################################################################
+
 class PdfDocument:
 
     _logger = _module_logger.getChild('DatasheetExtractor')
 
     FIRST_PAGE_ONE = True
 
+    # Memory budget in bytes for the pages kept in memory, cf. PdfPage.size()
+    PAGE_CACHE_SIZE = 64 * 1024**2
+
+    TEXT_CACHE_DIRECTORY = 'text-cache'
+    IMAGE_CACHE_DIRECTORY = 'image-cache'
+
     ##############################################
 
     @classmethod
@@ -64,14 +98,44 @@ class PdfDocument:
 
     ##############################################
 
-    def __init__(self, url: str, cache_path: str or Path = '.') -> None:
+    def __init__(
+            self,
+            url: str,
+            cache_path: str or Path = '.',
+            page_cache_size: int = PAGE_CACHE_SIZE,
+            text_cache: bool = False,
+            image_cache_size: int = PdfImageCache.CACHE_SIZE,
+            image_disk_cache: bool = False,
+            image_disk_cache_size: int = PdfImageDiskCache.CACHE_SIZE,
+    ) -> None:
+        """Open a PDF document from a path or an URL.
+
+        If *text_cache* is set, the text extracted from the pages is stored in a persistent cache
+        under *cache_path* and reused by the following runs.
+
+        Likewise if *image_disk_cache* is set, the rendered pixmaps are stored under *cache_path*,
+        cf. :attr:`image_cache`.
+
+        """
         url = str(url)
         parsed_url = urlparse(url)
         # Fixme: cls
         self._cache_path = Path(cache_path)
         self._doc = None
-        self._pages = {}
+        # MuPDF is not thread safe for a document, but a display list can be rendered concurrently
+        self._lock = threading.RLock()
+        self._content_hash = None
+        self._pages = LruCache(constraint=page_cache_size)
         self._image_cache = None
+        self._image_cache_size = image_cache_size
+        if image_disk_cache:
+            self._image_disk_cache = PdfImageDiskCache(
+                self,
+                self._cache_path.joinpath(self.IMAGE_CACHE_DIRECTORY),
+                image_disk_cache_size,
+            )
+        else:
+            self._image_disk_cache = None
         if parsed_url.scheme:
             self._url = url
             self._path = None
@@ -80,6 +144,10 @@ class PdfDocument:
             self._url = None
             self._path = url
             self._load()
+        if text_cache:
+            self._text_cache = PdfTextCache(self, self._cache_path.joinpath(self.TEXT_CACHE_DIRECTORY))
+        else:
+            self._text_cache = None
         self._metadata = Metadata(self)
         # return a list of lists [[level, title, page, …], …]
         # self._doc.get_toc()
@@ -104,6 +172,18 @@ class PdfDocument:
             self._path = Path(self._cache_path).joinpath(filename)
         return self._path
 
+    @property
+    def lock(self) -> threading.RLock:
+        """Lock to serialise the accesses to the MuPDF document across threads"""
+        return self._lock
+
+    @property
+    def content_hash(self) -> str:
+        """SHA-256 of the PDF file, used to key the persistent caches"""
+        if self._content_hash is None:
+            self._content_hash = file_hash(self.path)
+        return self._content_hash
+
     ##############################################
 
     def _download(self) -> None:
@@ -135,11 +215,37 @@ class PdfDocument:
     @property
     def image_cache(self) -> PdfImageCache:
         if self._image_cache is None:
-            self._image_cache = PdfImageCache(self)
+            self._image_cache = PdfImageCache(
+                self,
+                self._image_cache_size,
+                disk_cache=self._image_disk_cache,
+            )
         return self._image_cache
 
     ##############################################
 
+    @property
+    def text_cache(self) -> PdfTextCache | None:
+        return self._text_cache
+
+    ##############################################
+
+    @property
+    def page_cache_size(self) -> int:
+        """Memory budget in bytes of the page cache"""
+        return self._pages.constraint
+
+    @page_cache_size.setter
+    def page_cache_size(self, value: int) -> None:
+        self._pages.constraint = value
+
+    @property
+    def page_cache_usage(self) -> int:
+        """Estimated memory used by the page cache in bytes"""
+        return self._pages.size()
+
+    ##############################################
+
     @property
     def number_of_pages(self) -> int:
         return self._doc.page_count
@@ -173,7 +279,8 @@ class PdfDocument:
             # for page in doc:
             # for page in reversed(doc):
             # for page in doc.pages(start, stop, step):
-            fitz_page = self._doc[page_number_]
+            with self._lock:
+                fitz_page = self._doc[page_number_]
             return PdfPage(self, fitz_page)
         else:
             message = f"Out of page index {page_number}"
@@ -183,12 +290,19 @@ class PdfDocument:
     ##############################################
 
     def _page(self, page_number: int) -> PdfPage:
-        if page_number not in self._pages:
+        # Pages are kept in a LRU cache, the older ones are released when the memory budget is
+        # exceeded and reloaded on demand
+        page = self._pages.get(page_number)
+        if page is None:
             page = self._load_page(page_number)
-            self._pages[page_number] = page
-            return page
-        else:
-            return self._pages[page_number]
+            self._pages.add(page)
+        return page
+
+    def _update_page_cache(self, page: PdfPage) -> None:
+        # Called by a page when its memory footprint changed, e.g. text extraction
+        # Note: streamed pages are not in the cache, and can be prefetched in another thread
+        #   the cache is recycled automatically
+        self._pages.update(page.key())
 
     @property
     def first_page(self) -> PdfPage:
@@ -212,6 +326,110 @@ class PdfDocument:
 
     ##############################################
 
+    def _prefetch_page(self, page_number: int) -> PdfPage:
+        page = self._load_page(page_number)
+        page.text   # extract the text layer
+        return page
+
+    def iter_pages(
+            self,
+            start: Optional[int] = None,
+            stop: Optional[int] = None,
+            keep: bool = False,
+            prefetch: int = 0,
+    ) -> Iterator[PdfPage]:
+        """Iterate over the pages from *start* to *stop* excluded, by default over the whole document.
+
+        If *keep* is False, the pages are not added to the page cache and a page is released as soon
+        as the next one is requested, thus a page must not be used after the iteration step.  Pages
+        already in the cache are yielded as usual.
+
+        If *prefetch* is not null, the text of the next *prefetch* pages is extracted in a
+        background thread while the caller processes the current page.
+
+        """
+        if start is None:
+            start = self.first_page_number
+        if stop is None:
+            stop = self.last_page_number + 1
+        page_numbers = range(start, stop)
+        # Note: MuPDF is not thread safe, we use a single worker so as to never extract two pages
+        #   at the same time
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='PdfDocument') if prefetch else None
+        futures: dict[int, Future] = {}
+        try:
+            for i, page_number in enumerate(page_numbers):
+                if executor is not None:
+                    for _ in page_numbers[i+1:i+1+prefetch]:
+                        if _ not in futures and _ not in self._pages:
+                            futures[_] = executor.submit(self._prefetch_page, _)
+                future = futures.pop(page_number, None)
+                page = self._pages.get(page_number)
+                if page is not None:
+                    if future is not None:
+                        future.cancel()
+                    yield page
+                    continue
+                if future is not None:
+                    page = future.result()
+                else:
+                    page = self._load_page(page_number)
+                if keep:
+                    self._pages.add(page)
+                    yield page
+                else:
+                    yield page
+                    page.release()
+                del page
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    ##############################################
+
+    def map_pages(
+            self,
+            func: Callable[[PdfPage], Any],
+            pages: Optional[Iterable[int]] = None,
+            workers: Optional[int] = None,
+            chunk_size: Optional[int] = None,
+    ) -> list:
+        """Call *func* on each page of *pages*, by default the whole document, using a pool of
+        *workers* processes, by default the number of CPUs.  Return the list of results in page
+        order.
+
+        fitz objects cannot be shared across processes, thus each worker reopens the document by
+        path.  *func* must be picklable, i.e. a module level function or a class method,
+        e.g. :meth:`PinoutExtractor.page_pinout_quad`, and return plain data.
+
+        Pages are sharded in chunks of *chunk_size* consecutive pages.
+
+        """
+        if pages is None:
+            pages = range(self.first_page_number, self.last_page_number + 1)
+        pages = list(pages)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers == 1:
+            return _map_pages_job(func, pages, self)
+        if chunk_size is None:
+            # a few chunks per worker so as to balance the load
+            chunk_size = max(1, len(pages) // (4*workers))
+        chunks = [pages[i:i+chunk_size] for i in range(0, len(pages), chunk_size)]
+        self._logger.info(f"Map {func.__qualname__} on {len(pages)} pages using {workers} processes")
+        with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_map_pages_worker,
+                initargs=(str(self.path), str(self._cache_path), self._text_cache is not None),
+        ) as executor:
+            futures = [executor.submit(_map_pages_job, func, _) for _ in chunks]
+            results = []
+            for future in futures:
+                results.extend(future.result())
+        return results
+
+    ##############################################
+
     # def iter_until(self, last_page: Optional[int] = None) -> Iterator[PdfPage]:
     #     if last_page is None:
     #         last_page = len(self) - 1
@@ -0,0 +1,214 @@
+####################################################################################################
+#
+# DatasheetExtractor - A Python library to extract data from datasheet
+# Copyright (C) 2022 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""This module implements a persistent cache for the pixmaps rendered from the PDF pages.
+
+It is the disk tier of :class:`PdfImageCache`.  Entries are stored in a directory named after the
+SHA-256 of the PDF file.  A file contains a small header followed by the raw samples compressed
+using :mod:`zlib` at the fastest level, which is several times faster to load than a PNG.
+
+The cache has a size limit shared by all the documents stored under the same path.  The access
+time is tracked using the modification time of the files, the least recently used files are
+deleted when the limit is exceeded.
+
+"""
+
+####################################################################################################
+
+__all__ = ['PdfImageDiskCache']
+
+####################################################################################################
+
+from pathlib import Path
+import hashlib
+import logging
+import os
+import struct
+import threading
+import zlib
+
+# https://github.com/pymupdf/PyMuPDF
+import fitz
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class PdfImageDiskCache:
+
+    _logger = _module_logger.getChild('PdfImageDiskCache')
+
+    # Increment when the format changes
+    VERSION = 1
+
+    SUFFIX = '.pixz'
+    MAGIC = b'PIXZ'
+    # magic, version, width, height, n, alpha, x, y, xres, yres
+    HEADER = struct.Struct('<4sHIIBBiiII')
+
+    CACHE_SIZE = 1024**3   # bytes
+    # fraction of the size limit kept after a cleanup, so as to not cleanup on each write
+    CLEANUP_RATIO = .9
+
+    COMPRESSION_LEVEL = 1
+
+    ##############################################
+
+    def __init__(self, document: 'PdfDocument', path: str | Path, cache_size: int = CACHE_SIZE) -> None:
+        self._document = document
+        self._path = Path(path)
+        self._cache_size = cache_size
+        self._usage = None
+        self._lock = threading.Lock()
+
+    ##############################################
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def cache_size(self) -> int:
+        return self._cache_size
+
+    @cache_size.setter
+    def cache_size(self, value: int) -> None:
+        self._cache_size = value
+        self.cleanup()
+
+    ##############################################
+
+    def _files(self) -> list[tuple[Path, os.stat_result]]:
+        files = []
+        for path in self._path.glob(f'*/*{self.SUFFIX}'):
+            try:
+                files.append((path, path.stat()))
+            except FileNotFoundError:
+                # removed by another process
+                pass
+        return files
+
+    ##############################################
+
+    @property
+    def usage(self) -> int:
+        """Size of the cache on disk in bytes"""
+        with self._lock:
+            if self._usage is None:
+                self._usage = sum(_[1].st_size for _ in self._files())
+            return self._usage
+
+    ##############################################
+
+    def _entry_path(self, key: str) -> Path:
+        # the key can contain any character, e.g. a clip tuple
+        digest = hashlib.sha256(f'{key}-v{self.VERSION}'.encode('utf-8')).hexdigest()[:32]
+        return self._path.joinpath(self._document.content_hash, f'{digest}{self.SUFFIX}')
+
+    ##############################################
+
+    @classmethod
+    def _colorspace(cls, n: int, alpha: bool) -> fitz.Colorspace:
+        return {
+            1: fitz.csGRAY,
+            3: fitz.csRGB,
+            4: fitz.csCMYK,
+        }[n - int(alpha)]
+
+    ##############################################
+
+    def get(self, key: str) -> fitz.Pixmap | None:
+        """Return the pixmap for the key or :obj:`None` if not cached"""
+        path = self._entry_path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            magic, version, width, height, n, alpha, x, y, xres, yres = self.HEADER.unpack_from(data)
+            if magic != self.MAGIC or version != self.VERSION:
+                raise ValueError
+            samples = zlib.decompress(memoryview(data)[self.HEADER.size:])
+            pixmap = fitz.Pixmap(self._colorspace(n, alpha), width, height, samples, alpha)
+        except (struct.error, zlib.error, KeyError, ValueError, RuntimeError):
+            self._logger.warning(f"Invalid cache entry {path}")
+            path.unlink(missing_ok=True)
+            return None
+        pixmap.set_origin(x, y)
+        pixmap.set_dpi(xres, yres)
+        # touch the file for the LRU cleanup
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return pixmap
+
+    ##############################################
+
+    def set(self, key: str, pixmap: fitz.Pixmap) -> None:
+        path = self._entry_path(key)
+        header = self.HEADER.pack(
+            self.MAGIC, self.VERSION,
+            pixmap.width, pixmap.height, pixmap.n, int(pixmap.alpha),
+            pixmap.x, pixmap.y, pixmap.xres, pixmap.yres,
+        )
+        data = header + zlib.compress(pixmap.samples_mv, self.COMPRESSION_LEVEL)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write then rename so as a concurrent reader never sees a partial file
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}-{threading.get_ident()}.tmp')
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as exception:
+            self._logger.warning(f"Cannot write cache entry {path}: {exception}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        with self._lock:
+            if self._usage is not None:
+                self._usage += len(data)
+        # else the scan includes the new file
+        if self.usage > self._cache_size:
+            self.cleanup()
+
+    ##############################################
+
+    def cleanup(self) -> int:
+        """Delete the least recently used files until the size fits the limit.  Return the number of
+        deleted files.
+
+        """
+        with self._lock:
+            files = self._files()
+            usage = sum(_[1].st_size for _ in files)
+            number_of_deleted_files = 0
+            if usage > self._cache_size:
+                size_limit = self._cache_size * self.CLEANUP_RATIO
+                files.sort(key=lambda _: _[1].st_mtime)
+                for path, stat in files:
+                    if usage <= size_limit:
+                        break
+                    path.unlink(missing_ok=True)
+                    usage -= stat.st_size
+                    number_of_deleted_files += 1
+                self._logger.info(f"Deleted {number_of_deleted_files} files")
+            self._usage = usage
+            return number_of_deleted_files
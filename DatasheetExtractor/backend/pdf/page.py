@@ -25,26 +25,83 @@ __all__ = ['PdfPage']
 ####################################################################################################
 
 #from pathlib import Path
-from pprint import pprint
-from typing import Iterator, Optional
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
 
 from enum import Enum, auto
 import logging
-import io
+import threading
 
 # https://github.com/pymupdf/PyMuPDF
 import fitz
+# low level MuPDF bindings, cf. render_into
+from fitz import mupdf
 
 import numpy as np
 
 from IntervalArithmetic import IntervalInt2D
 
+from .spatial_index import SpatialIndex
+
 ####################################################################################################
 
 _module_logger = logging.getLogger(__name__)
 
 ####################################################################################################
 
+class _AntialiasingLock:
+
+    """The anti-aliasing level is a MuPDF global.  Renders at the current level run concurrently, a
+    render at another level waits for them and runs alone.
+
+    """
+
+    ##############################################
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._number_of_renders = 0
+        self._exclusive = False
+        # don't starve the exclusive renders
+        self._number_of_waiting = 0
+
+    ##############################################
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        with self._condition:
+            self._condition.wait_for(lambda: not self._exclusive and not self._number_of_waiting)
+            self._number_of_renders += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._number_of_renders -= 1
+                if not self._number_of_renders:
+                    self._condition.notify_all()
+
+    ##############################################
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        with self._condition:
+            self._number_of_waiting += 1
+            try:
+                self._condition.wait_for(lambda: not self._exclusive and not self._number_of_renders)
+            finally:
+                self._number_of_waiting -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._exclusive = False
+                self._condition.notify_all()
+
+_antialiasing_lock = _AntialiasingLock()
+
+####################################################################################################
+
 class Direction(Enum):
     horizontal = auto()
     vertical = auto()
@@ -96,37 +153,273 @@ def round_point(x: float, scale: float = 10) -> int:
 
 ####################################################################################################
 
-class Line:
+class PixmapArray:
+
+    """This class exposes the samples of a :class:`fitz.Pixmap` to NumPy using the array interface.
+
+    The array shares the pixmap memory and keeps a reference to this object as base, so as the
+    pixmap cannot be freed while the array is alive.
+
+    """
 
     ##############################################
 
-    def __init__(
+    def __init__(self, pixmap: fitz.Pixmap) -> None:
+        self.pixmap = pixmap
+        # Note: np.frombuffer(pixmap.samples_mv) doesn't keep the pixmap alive
+        self.__array_interface__ = dict(
+            version=3,
+            shape=(pixmap.height, pixmap.width, pixmap.n),
+            strides=(pixmap.stride, pixmap.n, 1),
+            typestr='|u1',
+            data=(pixmap.samples_ptr, False),
+        )
+
+    ##############################################
+
+    @classmethod
+    def to_array(cls, pixmap: fitz.Pixmap) -> np.ndarray:
+        """Return a (height, width, n) array without copy, n includes the alpha channel."""
+        return np.asarray(cls(pixmap))
+
+####################################################################################################
+
+class SpanTable:
+
+    """This class stores the text spans of a page in a columnar way.
+
+    Columns are stored in a NumPy structured array, cf. :attr:`DTYPE`, coordinates are scaled
+    integers, cf. :meth:`PdfPage.to_scaled`.  The texts of the spans are concatenated in a single
+    string, the columns *text_start* and *text_stop* give the span slice.
+
+    """
+
+    DTYPE = np.dtype([
+        ('x', np.int32),   # origin
+        ('y', np.int32),
+        ('x_min', np.int32),   # bbox
+        ('y_min', np.int32),
+        ('x_max', np.int32),
+        ('y_max', np.int32),
+        ('size', np.int32),   # font size
+        ('color', np.uint32),   # sRGB
+        ('direction', np.uint8),   # Direction value
+        ('block', np.int32),   # location of the span in the text dict
+        ('line', np.int32),
+        ('span', np.int32),
+        ('text_start', np.int32),
+        ('text_stop', np.int32),
+    ])
+
+    ##############################################
+
+    @staticmethod
+    def _direction(line_direction: tuple[float, float]) -> Direction:
+        match line_direction:
+            case (1.0, 0.0):
+                return Direction.horizontal
+            # case (-1.0, 0.0):
+            #     return Direction.horizontal
+            case (0.0, 1.0):
+                return Direction.vertical
+            case (0.0, -1.0):
+                return Direction.vertical
+            case _:
+                raise NotImplementedError('direction %s', str(line_direction))
+
+    ##############################################
+
+    @classmethod
+    def from_text_dict(cls, text: dict, scale: int) -> 'SpanTable':
+        """Build the table from a fitz `get_text('dict')`"""
+        # lines are sorted by y block
+        # then by x
+        # right justified blocks on header are placed at the end
+        coordinates = []
+        integers = []
+        texts = []
+        offset = 0
+        for b, block in enumerate(text['blocks']):
+            if 'lines' in block:
+                for l, line in enumerate(block['lines']):
+                    direction = cls._direction(line['dir']).value
+                    for s, span in enumerate(line['spans']):
+                        span_text = span['text']
+                        stop = offset + len(span_text)
+                        coordinates.append((*span['origin'], *span['bbox'], span['size']))
+                        integers.append((span['color'], direction, b, l, s, offset, stop))
+                        texts.append(span_text)
+                        offset = stop
+        array = np.zeros(len(coordinates), dtype=cls.DTYPE)
+        if coordinates:
+            # same as int(x * scale)
+            coordinates = (np.array(coordinates, dtype=np.float64) * scale).astype(np.int32)
+            integers = np.array(integers, dtype=np.int64)
+            for i, name in enumerate(('x', 'y', 'x_min', 'y_min', 'x_max', 'y_max', 'size')):
+                array[name] = coordinates[:, i]
+            for i, name in enumerate(('color', 'direction', 'block', 'line', 'span', 'text_start', 'text_stop')):
+                array[name] = integers[:, i]
+        return cls(array, ''.join(texts))
+
+    ##############################################
+
+    def __init__(self, array: np.ndarray, text: str) -> None:
+        self._array = array
+        self._text = text
+
+    ##############################################
+
+    def __len__(self) -> int:
+        return self._array.size
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Return a column"""
+        return self._array[name]
+
+    @property
+    def array(self) -> np.ndarray:
+        return self._array
+
+    @property
+    def nbytes(self) -> int:
+        return self._array.nbytes + len(self._text)
+
+    ##############################################
+
+    def text(self, index: int) -> str:
+        row = self._array[index]
+        return self._text[row['text_start']:row['text_stop']]
+
+    ##############################################
+
+    def line(self, index: int) -> 'Line':
+        return Line(self, index)
+
+    def lines(self, indexes: Iterable[int]) -> list['Line']:
+        return [Line(self, int(_)) for _ in indexes]
+
+    def __iter__(self) -> Iterator['Line']:
+        for i in range(self._array.size):
+            yield Line(self, i)
+
+    ##############################################
+
+    def _center(self, axe: str) -> np.ndarray:
+        # same as Line.center
+        inf = self._array[f'{axe}_min'].astype(np.int64)
+        sup = self._array[f'{axe}_max'].astype(np.int64)
+        return (.5*(inf + sup)).astype(np.int64)
+
+    ##############################################
+
+    def bucket(
             self,
-            x: int,
-            y: int,
-            bbox: list[int],
-            direction: Direction,
-            size: float,
-            color: int,
-            text: str,
-            location: str,
-    ) -> None:
-        self.x = x
-        self.y = y
-        x_min, y_min, x_max, y_max = bbox
-        self.bbox = IntervalInt2D((x_min, x_max), (y_min, y_max))
-        self.size = size
-        self.color = color
-        self.text = text
-        self.direction = direction
-        self.location = location
+            axe: str = 'x',
+            use_center1: bool = False,   # use centre for axe
+            use_center2: bool = False,   # use centre for second axe
+            ensure_direction: bool | Direction | None = False,   # if line direction matches axe
+            round_scale: int = 10,   # scale x
+            indexes: Optional[np.ndarray] = None,
+    ) -> list[np.ndarray]:
+        """Group the spans by rounded *axe* coordinate, then sort each group on the second axe.
+
+        Return a list of arrays of row indexes, groups are sorted by coordinate.  Spans having the
+        same coordinate on the second axe keep the table order.
+
+        *indexes* restricts the grouping to these rows, e.g. a query on :meth:`PdfPage.span_index`.
+
+        Cf. :meth:`PdfPage.sort_xy` for the parameters.
+
+        """
+        array = self._array
+        if indexes is None:
+            indexes = np.arange(array.size)
+        else:
+            indexes = np.sort(np.asarray(indexes, dtype=np.int64))
+        if ensure_direction is True:
+            direction = Direction.vertical if axe == 'x' else Direction.horizontal
+            indexes = indexes[array['direction'][indexes] == direction.value]
+        elif isinstance(ensure_direction, Direction):
+            indexes = indexes[array['direction'][indexes] == ensure_direction.value]
+        if not indexes.size:
+            return []
+        axe2 = 'y' if axe == 'x' else 'x'
+        key1 = self._center(axe) if use_center1 else array[axe].astype(np.int64)
+        key2 = self._center(axe2) if use_center2 else array[axe2].astype(np.int64)
+        # same as PdfPage.round, np.round rounds half to even as Python
+        key1 = np.round(key1[indexes] / round_scale).astype(np.int64)
+        key2 = key2[indexes]
+        order = np.lexsort((indexes, key2, key1))
+        key1 = key1[order]
+        boundaries = np.flatnonzero(np.diff(key1)) + 1
+        return np.split(indexes[order], boundaries)
+
+####################################################################################################
+
+class Line:
+
+    """This class implements a lightweight view on a :class:`SpanTable` row."""
+
+    __slots__ = ('_table', '_index', 'siblings')
+
+    ##############################################
+
+    def __init__(self, table: SpanTable, index: int) -> None:
+        self._table = table
+        self._index = index
         self.siblings = []
 
     ##############################################
 
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def _row(self) -> np.void:
+        return self._table.array[self._index]
+
+    @property
+    def x(self) -> int:
+        return int(self._row['x'])
+
+    @property
+    def y(self) -> int:
+        return int(self._row['y'])
+
+    @property
+    def bbox(self) -> IntervalInt2D:
+        row = self._row
+        return IntervalInt2D((row['x_min'], row['x_max']), (row['y_min'], row['y_max']))
+
+    @property
+    def size(self) -> int:
+        return int(self._row['size'])
+
+    @property
+    def color(self) -> int:
+        return int(self._row['color'])
+
+    @property
+    def text(self) -> str:
+        return self._table.text(self._index)
+
+    @property
+    def direction(self) -> Direction:
+        return Direction(self._row['direction'])
+
+    @property
+    def location(self) -> str:
+        row = self._row
+        return f"{row['block']}/{row['line']}/{row['span']}"
+
+    ##############################################
+
     @property
     def center(self) -> list[int]:
-        return [int(_) for _ in self.bbox.center]
+        row = self._row
+        # same as IntervalInt2D.center
+        return [int(.5*(int(row['x_min']) + int(row['x_max']))), int(.5*(int(row['y_min']) + int(row['y_max'])))]
 
     @property
     def center_x(self) -> int:
@@ -138,23 +431,23 @@ class Line:
 
     @property
     def x_min(self) -> int:
-        return self.bbox.x.inf
+        return int(self._row['x_min'])
 
     @property
     def x_max(self) -> int:
-        return self.bbox.x.sup
+        return int(self._row['x_max'])
 
     @property
     def y_min(self) -> int:
-        return self.bbox.y.inf
+        return int(self._row['y_min'])
 
     @property
     def y_max(self) -> int:
-        return self.bbox.y.sup
+        return int(self._row['y_max'])
 
     @property
     def siblings_bbox(self):
-        bbox = self.bbox.clone()
+        bbox = self.bbox
         for _ in self.siblings:
             bbox |= _.bbox
         return bbox
@@ -231,6 +524,19 @@ class PdfPage:
     ###! to transform float X.12... to int X1
     UNIT_SCALE = 10
 
+    # get_text flags, used as key for the text cache
+    TEXT_FLAGS = 'dict-sort'
+
+    # Estimated memory footprint in bytes, used for the page cache, cf. size()
+    #  measured using a recursive sys.getsizeof on get_text('dict')
+    PAGE_SIZE = 1024
+    BLOCK_SIZE = 400
+    LINE_SIZE = 400
+    SPAN_SIZE = 1300
+    #  display list bytes per byte of the content stream, measured from the RSS on vector drawings
+    #  (about 3), images are stored apart by MuPDF and are not counted
+    DISPLAY_LIST_FACTOR = 4
+
     ##############################################
 
     @classmethod
@@ -253,13 +559,19 @@ class PdfPage:
     def __init__(self, document: 'Document', fitz_page: fitz.Page) -> None:
         self._document = document
         self._fitz_page = fitz_page
-        pprint(fitz_page.mediabox)
-        # Fixme: lazy ?
-        self._text = fitz_page.get_text(
-            'dict',
-            clip=None,
-            sort=True,
-        )
+        # The text layer is extracted on demand, cf. text property,
+        # so as render only paths don't pay for get_text
+        self._text = None
+        self._span_table = None
+        self._span_index = None
+        self._color_boxes = None
+        self._box_index = None
+        self._rulings = None
+        # text and span tables per clip region, cf. text_in
+        self._clip_texts = {}
+        self._clip_tables = {}
+        self._display_list = None
+        self._display_list_size = 0
 
         # page.get_links()
         # page.annots()
@@ -269,6 +581,10 @@ class PdfPage:
     def __int__(self) -> int:
         return self._fitz_page.number
 
+    @property
+    def document(self) -> 'PdfDocument':
+        return self._document
+
     # Fixme: -> page_number ?
     @property
     def number(self) -> int:
@@ -284,18 +600,150 @@ class PdfPage:
 
     ##############################################
 
+    def _extract_text(self, clip: Optional[tuple[float, float, float, float]] = None) -> dict:
+        # Extract the text using the persistent cache if enabled
+        if clip is None:
+            flags = self.TEXT_FLAGS
+        else:
+            # repr is exact, two clips cannot share an entry
+            flags = self.TEXT_FLAGS + '-clip-' + '_'.join(repr(float(_)) for _ in clip)
+        text_cache = self._document.text_cache
+        text = None
+        if text_cache is not None:
+            text = text_cache.get(int(self), flags)
+        if text is None:
+            _module_logger.debug(f'Extract text of {self} {self._fitz_page.mediabox} clip {clip}')
+            with self._document.lock:
+                text = self._fitz_page.get_text(
+                    'dict',
+                    clip=clip,
+                    sort=True,
+                )
+            if text_cache is not None:
+                text_cache.set(int(self), flags, text)
+        return text
+
+    @property
+    def text(self) -> dict:
+        """Return the text layer as a dict, cf. fitz `get_text('dict')`.
+
+        The text is extracted on first access and kept by the page.
+
+        """
+        if self._text is None:
+            self._text = self._extract_text()
+            self._document._update_page_cache(self)
+        return self._text
+
+    ##############################################
+
+    def _to_clip(self, rect: IntervalInt2D | Iterable[float], scaled: bool) -> tuple[float, float, float, float]:
+        if isinstance(rect, IntervalInt2D):
+            rect = rect.bounding_box
+        if scaled:
+            return tuple(self.from_scaled(_) for _ in rect)
+        return tuple(float(_) for _ in rect)
+
+    def text_in(self, rect: IntervalInt2D | Iterable[float], scaled: bool = False) -> dict:
+        """Return the text dict of the region *rect*, cf. :attr:`text`.
+
+        Only this region is extracted by MuPDF, results are cached by region.  *rect* is an
+        :class:`IntervalInt2D` or a `(x_min, y_min, x_max, y_max)` sequence in point unit,
+        e.g. from :meth:`percent_bbox`, or in scaled unit if *scaled* is set.
+
+        """
+        clip = self._to_clip(rect, scaled)
+        text = self._clip_texts.get(clip)
+        if text is None:
+            text = self._extract_text(clip)
+            self._clip_texts[clip] = text
+            self._document._update_page_cache(self)
+        return text
+
+    def lines_in(self, rect: IntervalInt2D | Iterable[float], scaled: bool = False) -> list[Line]:
+        """Return the lines of the region *rect*, cf. :meth:`text_in`"""
+        clip = self._to_clip(rect, scaled)
+        table = self._clip_tables.get(clip)
+        if table is None:
+            table = SpanTable.from_text_dict(self.text_in(clip), self.UNIT_SCALE)
+            self._clip_tables[clip] = table
+            self._document._update_page_cache(self)
+        return list(table)
+
+    ##############################################
+
+    @property
+    def has_text(self) -> bool:
+        """Return True if the text layer was already extracted."""
+        return self._text is not None
+
+    def release(self) -> None:
+        """Release the text layer and the fitz page, the page cannot be used afterwards."""
+        self._text = None
+        self._span_table = None
+        self._span_index = None
+        self._color_boxes = None
+        self._box_index = None
+        self._rulings = None
+        self._clip_texts = {}
+        self._clip_tables = {}
+        self._display_list = None
+        self._display_list_size = 0
+        self._fitz_page = None
+
+    ##############################################
+
+    # Cache Object Protocol, cf. DatasheetExtractor.common.LruCache.ObjectProtocol
+
+    def key(self) -> int:
+        return self.number
+
+    @classmethod
+    def _text_size(cls, text: dict) -> int:
+        size = 0
+        for block in text['blocks']:
+            size += cls.BLOCK_SIZE
+            if 'lines' in block:
+                for line in block['lines']:
+                    size += cls.LINE_SIZE
+                    for span in line['spans']:
+                        size += cls.SPAN_SIZE + len(span['text'])
+            elif 'image' in block:
+                size += len(block['image'])
+        return size
+
+    def size(self) -> int:
+        """Return an estimation of the memory footprint of the page in bytes."""
+        size = self.PAGE_SIZE
+        if self._text is not None:
+            size += self._text_size(self._text)
+        if self._span_table is not None:
+            size += self._span_table.nbytes
+        for _ in self._clip_texts.values():
+            size += self._text_size(_)
+        for _ in self._clip_tables.values():
+            size += _.nbytes
+        if self._display_list is not None:
+            size += self._display_list_size
+        return size
+
+    ##############################################
+
     # _fitz_page.bound()
     #   Determine the rectangle of the page.
     #   For PDF documents this usually also coincides with mediabox and cropbox, but not always.
     #   For example, if the page is rotated, then this is reflected by this method
 
+    # Note: get_text('dict') width and height are the page rect, thus we don't need to extract the
+    #   text layer here
+
     @property
     def width(self):
-        return self.to_scaled(self._text['width'])
+        return self.to_scaled(self._fitz_page.rect.width)
 
     @property
     def height(self):
-        return self.to_scaled(self._text['height'])
+        return self.to_scaled(self._fitz_page.rect.height)
 
     ##############################################
 
@@ -320,84 +768,247 @@ class PdfPage:
 
     ##############################################
 
-    def pixmap(self, dpi: int = 72, alpha=False) -> fitz.Pixmap:
-        # Pixmap has the dimension of the page with width and height rounded to integers and a default resolution of 72 dpi.
+    def display_list(self) -> fitz.DisplayList:
+        """Return the display list of the page.
+
+        The page content stream is interpreted once, then the display list can be rendered at
+        several resolutions and clips, and from several threads.
+
+        """
+        if self._display_list is None:
+            with self._document.lock:
+                if self._display_list is not None:
+                    return self._display_list
+                display_list = self._fitz_page.get_displaylist(annots=False)
+                self._display_list_size = self.DISPLAY_LIST_FACTOR * len(self._fitz_page.read_contents())
+                self._display_list = display_list
+            # the display list is accounted in the page cache budget
+            self._document._update_page_cache(self)
+        return self._display_list
+
+    ##############################################
+
+    def _render_matrix(
+            self,
+            dpi: int = 72,
+            rotation: int = 0,
+            width: Optional[int] = None,
+            height: Optional[int] = None,
+            fit: bool = False,
+    ) -> fitz.Matrix:
+        # Port of mudraw logic, cf. mupdf-cffi Page._transform_bounding_box
+        scale = dpi / 72
+        matrix = fitz.Matrix(scale, scale).prerotate(rotation)
+        bounds = self._fitz_page.rect * matrix
+        # If a resolution is specified, check to see whether width/height are exceeded if not, unset them.
+        if dpi != 72:
+            ibounds = bounds.round()
+            if width and ibounds.width <= width:
+                width = None
+            if height and ibounds.height <= height:
+                height = None
+        # Now width or height will be None unless they need to be enforced.
+        if width or height:
+            scale_x = (width or 0) / bounds.width
+            scale_y = (height or 0) / bounds.height
+            if fit:   # ignore aspect
+                if not scale_x:
+                    scale_x = 1.0   # keep computed width
+                elif not scale_y:
+                    scale_y = 1.0   # keep computed height
+            else:
+                if not scale_x:
+                    scale_x = scale_y
+                elif not scale_y:
+                    scale_y = scale_x
+                else:
+                    # take the smallest scale
+                    scale_x = scale_y = min(scale_x, scale_y)
+            matrix = matrix * fitz.Matrix(scale_x, scale_y)
+        return matrix
+
+    ##############################################
+
+    def pixmap(
+            self,
+            dpi: int = 72,
+            alpha=False,
+            clip: Optional[IntervalInt2D | Iterable[float]] = None,
+            rotation: int = 0,
+            width: Optional[int] = None,
+            height: Optional[int] = None,
+            fit: bool = False,
+            antialiasing_level: Optional[int] = None,
+    ) -> fitz.Pixmap:
+        """Render the page.
+
+        *rotation* is in degree.  If *width* or *height* is set and the page size at *dpi* exceeds
+        it, the page is scaled down to fit the size, keeping the aspect ratio unless *fit* is set.
+        *antialiasing_level* is in the range 0 to 8, by default the MuPDF global level is used.
+
+        """
+        # Pixmap has the dimension of the page with width and height rounded to integers and a default
+        # resolution of 72 dpi.
         #   210 mm / 25.4 * 72 = 595.27 px
         # so at 72 dpi pixmap coordinate are equivalent to page coordinate / UNIT_SCALE
         # https://pymupdf.readthedocs.io/en/latest/page.html#Page.get_pixmap
         # https://pymupdf.readthedocs.io/en/latest/pixmap.html#pixmap
-        pix = self._fitz_page.get_pixmap(
-            # matrix=,
-            dpi=dpi,
-            # colorspace=,
-            # clip=,
-            alpha=alpha,   # whether to add an alpha channel for transparency
-            annots=False,
-        )
+        # Same as Page.get_pixmap(dpi=dpi, annots=False) but rendered from the display list
+        # clip is in point unit, cf. text_in
+        if clip is not None:
+            clip = self._to_clip(clip, scaled=False)
+        matrix = self._render_matrix(dpi, rotation, width, height, fit)
+        def render():
+            return self.display_list().get_pixmap(
+                matrix=matrix,
+                # colorspace=,
+                clip=clip,
+                alpha=alpha,   # whether to add an alpha channel for transparency
+            )
+        pix = self._render(render, antialiasing_level)
+        pix.set_dpi(dpi, dpi)
         # return pix.samples, pix.width, pix.height, pix.stride, pix.alpha
         return pix
 
     ##############################################
 
-    def np_pixmap(self, dpi: int = 72, alpha=False) -> np.ndarray:
-        pix = self.pixmap(dpi, alpha)
-        array = np.frombuffer(pix.samples, dtype=np.uint8)
-        array.shape = pix.height, pix.width, 3
-        # from PIL import Image
-        # stream = pix.pil_tobytes(format='PNG')
-        # image = Image.open(io.BytesIO(stream))
-        # array = np.array(image)
-        return array
+    @staticmethod
+    def _render(render, antialiasing_level: Optional[int]):
+        # all the renders go through the lock, so as a render never sees a level set for another one
+        with _antialiasing_lock.shared():
+            # the level is only changed by an exclusive render
+            if antialiasing_level is None or antialiasing_level == fitz.TOOLS.show_aa_level()['graphics']:
+                return render()
+        with _antialiasing_lock.exclusive():
+            previous_level = fitz.TOOLS.show_aa_level()['graphics']
+            fitz.TOOLS.set_aa_level(antialiasing_level)
+            try:
+                return render()
+            finally:
+                fitz.TOOLS.set_aa_level(previous_level)
+
+    ##############################################
+
+    # number of components -> colorspace, alpha
+    RENDER_INTO_FORMATS = {
+        1: ('gray', 0),
+        2: ('gray', 1),
+        3: ('rgb', 0),
+        4: ('rgb', 1),
+    }
+
+    def render_into(
+            self,
+            array: np.ndarray,
+            dpi: int = 72,
+            clip: Optional[IntervalInt2D | Iterable[float]] = None,
+            rotation: int = 0,
+            antialiasing_level: Optional[int] = None,
+    ) -> np.ndarray:
+        """Render the page into a caller provided (height, width, n) uint8 C contiguous array, so as
+        a buffer can be reused to render many pages without allocation.  A shared memory block can be
+        used with ``np.ndarray(shape, np.uint8, buffer=shared_memory.buf)``.
+
+        *n* is 1 for gray, 2 for gray with alpha, 3 for RGB and 4 for RGB with alpha.  The array can
+        be larger than the page, the page is rendered in the top left corner and the remaining is
+        cleared.  Return the view of the array containing the page.
+
+        """
+        if (
+                array.dtype != np.uint8 or array.ndim != 3 or
+                not array.flags['C_CONTIGUOUS'] or not array.flags['WRITEABLE']
+        ):
+            raise ValueError("array must be a writable C contiguous uint8 (height, width, n) array")
+        buffer_height, buffer_width, n = array.shape
+        try:
+            colorspace, alpha = self.RENDER_INTO_FORMATS[n]
+        except KeyError:
+            raise ValueError(f"Unsupported number of components {n}")
+        if colorspace == 'gray':
+            colorspace = mupdf.fz_device_gray()
+        else:
+            colorspace = mupdf.fz_device_rgb()
+        matrix = mupdf.FzMatrix(*self._render_matrix(dpi, rotation))
+        display_list = self.display_list().this
+        rect = mupdf.fz_bound_display_list(display_list)
+        if clip is not None:
+            clip = mupdf.FzRect(*self._to_clip(clip, scaled=False))
+            rect = mupdf.fz_intersect_rect(rect, clip)
+        else:
+            clip = mupdf.FzRect(mupdf.FzRect.Fixed_INFINITE)
+        irect = mupdf.fz_round_rect(mupdf.fz_transform_rect(rect, matrix))
+        height = irect.y1 - irect.y0
+        width = irect.x1 - irect.x0
+        if height > buffer_height or width > buffer_width:
+            raise ValueError(f"array is too small {buffer_height}x{buffer_width} < {height}x{width}")
+        # the pixmap covers the whole buffer, since its stride is width * n
+        bbox = mupdf.FzIrect(irect.x0, irect.y0, irect.x0 + buffer_width, irect.y0 + buffer_height)
+        def render():
+            pixmap = mupdf.fz_new_pixmap_with_bbox_and_data(
+                colorspace, bbox, mupdf.FzSeparations(), alpha,
+                mupdf.python_mutable_buffer_data(array),
+            )
+            if alpha:
+                mupdf.fz_clear_pixmap(pixmap)
+            else:
+                mupdf.fz_clear_pixmap_with_value(pixmap, 0xFF)
+            device = mupdf.fz_new_draw_device_with_bbox(matrix, pixmap, irect)
+            try:
+                mupdf.fz_run_display_list(display_list, device, mupdf.FzMatrix(), clip, mupdf.FzCookie())
+            finally:
+                mupdf.fz_close_device(device)
+        self._render(render, antialiasing_level)
+        return array[:height, :width]
+
+    def pixmaps(
+            self,
+            dpis: Iterable[int],
+            alpha=False,
+            clip: Optional[IntervalInt2D | Iterable[float]] = None,
+    ) -> list[fitz.Pixmap]:
+        """Render the page at several resolutions using the same display list"""
+        return [self.pixmap(_, alpha, clip) for _ in dpis]
+
+    ##############################################
+
+    def np_pixmap(self, dpi: int = 72, alpha: bool = False, **kwargs) -> np.ndarray:
+        """Return the page as a (height, width, n) array, cf. :meth:`pixmap` for the parameters.
+
+        The array shares the memory of the pixmap, *n* is 4 if *alpha* is set, else 3.
+
+        """
+        pix = self.pixmap(dpi, alpha, **kwargs)
+        return PixmapArray.to_array(pix)
 
     ##############################################
 
     def to_png(self, path: str, **kwargs: dict) -> None:
-        from PIL import Image
-        # np_array = self.np_pixmap(**kwargs)
-        # Fixme: ValueError: buffer is not large enough
-        # image = Image.fromarray(np_array, mode='RGBA')
+        """Save the page to a PNG file, cf. :meth:`pixmap` for the parameters."""
         pix = self.pixmap(**kwargs)
-        stream = pix.pil_tobytes(format='PNG')
-        image = Image.open(io.BytesIO(stream))
-        image.save(path)
+        pix.save(path, output='png')
+
+    ##############################################
+
+    def span_table(self) -> SpanTable:
+        """Return the spans of the page as a :class:`SpanTable`, the table is built once."""
+        if self._span_table is None:
+            self._span_table = SpanTable.from_text_dict(self.text, self.UNIT_SCALE)
+            self._document._update_page_cache(self)
+        return self._span_table
 
     ##############################################
 
     @property
     def lines(self) -> Iterator[Line]:
-        # lines are sorted by y block
-        # then by x
-        # right justified blocks on header are placed at the end
-        for b, block in enumerate(self._text['blocks']):
-            if 'lines' in block:
-                for l, line in enumerate(block['lines']):
-                    match line['dir']:
-                        case (1.0, 0.0):
-                            direction = Direction.horizontal
-                        # case (-1.0, 0.0):
-                        #     direction = Direction.horizontal
-                        case (0.0, 1.0):
-                            direction = Direction.vertical
-                        case (0.0, -1.0):
-                            direction = Direction.vertical
-                        case _:
-                            raise NotImplementedError('direction %s', str(line['dir']))
-                    for s, span in enumerate(line['spans']):
-                        # pprint(span)
-                        x, y = [self.to_scaled(_) for _ in span['origin']]
-                        bbox = [self.to_scaled(_) for _ in span['bbox']]
-                        size = self.to_scaled(span['size'])
-                        location = f'{b}/{l}/{s}'
-                        color = span['color']
-                        yield Line(x, y, bbox, direction, size, color, span['text'], location)
+        return iter(self.span_table())
 
     ##############################################
 
     def filter_lines(self, size: float = None) -> Iterator[Line]:
         size = self.to_scaled(size)
-        for line in self.lines:
-            if size is not None and line.size == size:
-                yield line
+        table = self.span_table()
+        for i in np.flatnonzero(table['size'] == size):
+            yield table.line(int(i))
 
     ##############################################
 
@@ -406,57 +1017,136 @@ class PdfPage:
             axe: str = 'x',
             use_center1: bool = False,   # use centre for axe
             use_center2: bool = False,   # use centre for second axe
-            ensure_direction: bool = False,   # if line direction matches axe
+            ensure_direction: bool | Direction | None = False,   # if line direction matches axe
             round_scale: int = 10,   # scale x
             bounding_box: Optional[IntervalInt2D] = None,
     ) -> list:
-        # Create an axe map
-        axe_map = {}
-        for line in self.lines:
-            if bounding_box is not None:
-                if not line.bounding_box.is_included_in(bounding_box):
-                    continue
-            if isinstance(ensure_direction, bool):
-                if axe == 'x' and line.direction != Direction.vertical:
-                    continue
-                if axe == 'y' and line.direction != Direction.horizontal:
-                    continue
-            elif ensure_direction is not None:
-                if line.direction != ensure_direction:
-                    continue
-            if use_center1:
-                x = line.center_x if axe == 'x' else line.center_y
-            else:
-                x = line.x if axe == 'x' else line.y
-            x = self.round(x, round_scale)   # cf. cls.to_scaled()
-            axe_map.setdefault(x, [])
-            axe_map[x].append(line)
-        # sort on second axe
-        for line in axe_map.values():
-            def func(_: Line) -> int:
-                if use_center2:
-                    return _.center_x if axe == 'y' else _.center_y
-                else:
-                    return _.x if axe == 'y' else _.y
-            line.sort(key=func)
-        # return axe_map
-        return [axe_map[i] for i in sorted(axe_map.keys())]
+        # Group the lines by rounded axe coordinate, then sort them on the second axe,
+        # cf. SpanTable.bucket
+        table = self.span_table()
+        indexes = None
+        if bounding_box is not None:
+            indexes = self.span_index().contained_in(bounding_box)
+        groups = table.bucket(
+            axe=axe,
+            use_center1=use_center1,
+            use_center2=use_center2,
+            ensure_direction=ensure_direction,
+            round_scale=round_scale,
+            indexes=indexes,
+        )
+        return [table.lines(_) for _ in groups]
 
     ##############################################
 
     def color_boxes(
             self,
-    ):
-        boxes = []
-        drawings = self._fitz_page.get_drawings(extended=False)
-        for d in drawings:
-            if d['closePath']:
-                # pprint(d)
-                bbox = [int(round(_)) for _ in d['rect']]
-                box = Box(
-                    bbox=bbox,
-                    color=d['color'],
-                    fill=d['fill'],
-                )
-                boxes.append(box)
-        return boxes
+    ) -> list[Box]:
+        # get_drawings is expensive, boxes are cached
+        if self._color_boxes is None:
+            boxes = []
+            with self._document.lock:
+                drawings = self._fitz_page.get_drawings(extended=False)
+            for d in drawings:
+                if d['closePath']:
+                    # pprint(d)
+                    bbox = [int(round(_)) for _ in d['rect']]
+                    box = Box(
+                        bbox=bbox,
+                        color=d['color'],
+                        fill=d['fill'],
+                    )
+                    boxes.append(box)
+            self._color_boxes = boxes
+        return list(self._color_boxes)
+
+    ##############################################
+
+    # tolerance in point to classify a segment as horizontal or vertical
+    RULING_TOLERANCE = 1
+
+    def rulings(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return the horizontal and vertical segments drawn on the page, e.g. the borders of the
+        table cells, as two (N, 4) arrays of `x_min, y_min, x_max, y_max` in point unit.
+
+        Like Tabula, the segments of the stroked and filled paths are used, thus a rectangle gives
+        its four edges.
+
+        """
+        if self._rulings is None:
+            with self._document.lock:
+                drawings = self._fitz_page.get_drawings(extended=False)
+            segments = []
+            for d in drawings:
+                for item in d['items']:
+                    match item[0]:
+                        case 'l':
+                            p1, p2 = item[1:3]
+                            segments.append((p1.x, p1.y, p2.x, p2.y))
+                        case 're':
+                            x0, y0, x1, y1 = item[1]
+                            segments.extend((
+                                (x0, y0, x1, y0),
+                                (x0, y1, x1, y1),
+                                (x0, y0, x0, y1),
+                                (x1, y0, x1, y1),
+                            ))
+                        case 'qu':
+                            # only the axis aligned edges are kept below
+                            quad = item[1]
+                            points = (quad.ul, quad.ur, quad.lr, quad.ll, quad.ul)
+                            for p1, p2 in zip(points[:-1], points[1:]):
+                                segments.append((p1.x, p1.y, p2.x, p2.y))
+                        # curves are not rulings
+            segments = np.array(segments, dtype=np.float64).reshape(-1, 4)
+            x_min = np.minimum(segments[:, 0], segments[:, 2])
+            x_max = np.maximum(segments[:, 0], segments[:, 2])
+            y_min = np.minimum(segments[:, 1], segments[:, 3])
+            y_max = np.maximum(segments[:, 1], segments[:, 3])
+            segments = np.stack((x_min, y_min, x_max, y_max), axis=1)
+            width = x_max - x_min
+            height = y_max - y_min
+            tolerance = self.RULING_TOLERANCE
+            horizontal = (height <= tolerance) & (width > tolerance)
+            vertical = (width <= tolerance) & (height > tolerance)
+            self._rulings = (segments[horizontal], segments[vertical])
+        return self._rulings
+
+    ##############################################
+
+    # Spatial indexes use scaled coordinates as lines, cf. to_scaled,
+    #   use percent_bbox(..., round_scale=1) to get a rectangle in this unit
+
+    def span_index(self) -> SpatialIndex:
+        """Return a spatial index on the span bounding boxes, indexes refer to :meth:`span_table`"""
+        if self._span_index is None:
+            table = self.span_table()
+            bboxes = np.stack([table[_] for _ in ('x_min', 'y_min', 'x_max', 'y_max')], axis=1)
+            self._span_index = SpatialIndex(bboxes)
+        return self._span_index
+
+    def box_index(self) -> SpatialIndex:
+        """Return a spatial index on the drawing boxes, indexes refer to :meth:`color_boxes`
+
+        Note: boxes are in point unit, but the index uses scaled coordinates.
+
+        """
+        if self._box_index is None:
+            bboxes = np.array([_.bounding_box for _ in self.color_boxes()], dtype=np.int64)
+            self._box_index = SpatialIndex(bboxes * self.UNIT_SCALE)
+        return self._box_index
+
+    ##############################################
+
+    def lines_intersecting(self, rect: IntervalInt2D) -> list[Line]:
+        return self.span_table().lines(self.span_index().query(rect))
+
+    def lines_contained_in(self, rect: IntervalInt2D) -> list[Line]:
+        return self.span_table().lines(self.span_index().contained_in(rect))
+
+    def nearest_lines(self, point: tuple[int, int], k: int = 1) -> list[Line]:
+        return self.span_table().lines(self.span_index().nearest(point, k))
+
+    def boxes_contained_in(self, rect: IntervalInt2D) -> list[Box]:
+        boxes = self.color_boxes()
+        return [boxes[_] for _ in self.box_index().contained_in(rect)]
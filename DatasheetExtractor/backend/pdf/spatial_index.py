@@ -0,0 +1,109 @@
+####################################################################################################
+#
+# DatasheetExtractor - A Python library to extract data from datasheet
+# Copyright (C) 2022 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""This module implements a spatial index on a set of bounding boxes using an R-tree.
+
+"""
+
+####################################################################################################
+
+__all__ = ['SpatialIndex']
+
+####################################################################################################
+
+from itertools import islice
+from typing import Iterable
+
+import numpy as np
+
+# https://rtree.readthedocs.io/en/latest
+from rtree import index as rtree_index
+
+from IntervalArithmetic import IntervalInt2D
+
+####################################################################################################
+
+Rect = IntervalInt2D | Iterable[int]
+
+####################################################################################################
+
+class SpatialIndex:
+
+    """This class implements a spatial index on a set of bounding boxes.
+
+    Boxes are given as a (N, 4) array of `x_min, y_min, x_max, y_max` and queries return arrays of
+    indexes in this array.  A rectangle is an :class:`IntervalInt2D` or a `(x_min, y_min, x_max,
+    y_max)` sequence.
+
+    """
+
+    ##############################################
+
+    @staticmethod
+    def _to_bbox(rect: Rect) -> tuple[int, int, int, int]:
+        if isinstance(rect, IntervalInt2D):
+            return rect.bounding_box
+        return tuple(rect)
+
+    ##############################################
+
+    def __init__(self, bboxes: np.ndarray) -> None:
+        self._bboxes = np.asarray(bboxes).reshape(-1, 4)
+        if len(self._bboxes):
+            # bulk loading is much faster than insertions
+            stream = ((i, tuple(bbox), None) for i, bbox in enumerate(self._bboxes.tolist()))
+            self._index = rtree_index.Index(stream)
+        else:
+            self._index = rtree_index.Index()
+
+    ##############################################
+
+    def __len__(self) -> int:
+        return len(self._bboxes)
+
+    @property
+    def bboxes(self) -> np.ndarray:
+        return self._bboxes
+
+    ##############################################
+
+    def query(self, rect: Rect) -> np.ndarray:
+        """Return the indexes of the boxes intersecting *rect*"""
+        return np.sort(np.fromiter(self._index.intersection(self._to_bbox(rect)), dtype=np.int64))
+
+    ##############################################
+
+    def contained_in(self, rect: Rect) -> np.ndarray:
+        """Return the indexes of the boxes included in *rect*"""
+        x_min, y_min, x_max, y_max = self._to_bbox(rect)
+        indexes = self.query(rect)
+        bboxes = self._bboxes[indexes]
+        mask = (
+            (x_min <= bboxes[:, 0]) & (y_min <= bboxes[:, 1]) &
+            (bboxes[:, 2] <= x_max) & (bboxes[:, 3] <= y_max)
+        )
+        return indexes[mask]
+
+    ##############################################
+
+    def nearest(self, point: Iterable[int], k: int = 1) -> np.ndarray:
+        """Return the indexes of the *k* nearest boxes to *point*, sorted by distance"""
+        x, y = point
+        return np.fromiter(islice(self._index.nearest((x, y, x, y), k), k), dtype=np.int64)
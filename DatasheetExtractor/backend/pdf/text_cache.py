@@ -0,0 +1,108 @@
+####################################################################################################
+#
+# DatasheetExtractor - A Python library to extract data from datasheet
+# Copyright (C) 2022 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+"""This module implements a persistent cache for the text extracted from the PDF pages.
+
+Entries are stored in a directory named after the SHA-256 of the PDF file, one file per page and
+extraction flags.  The text dict is serialised using :mod:`marshal` which is a compact binary
+format, fast to load and which cannot execute code.
+
+"""
+
+####################################################################################################
+
+__all__ = ['PdfTextCache']
+
+####################################################################################################
+
+from pathlib import Path
+import logging
+import marshal
+import os
+import threading
+
+# https://github.com/pymupdf/PyMuPDF
+import fitz
+
+####################################################################################################
+
+_module_logger = logging.getLogger(__name__)
+
+####################################################################################################
+
+class PdfTextCache:
+
+    _logger = _module_logger.getChild('PdfTextCache')
+
+    # Increment when the format changes
+    VERSION = 1
+
+    SUFFIX = '.marshal'
+
+    ##############################################
+
+    def __init__(self, document: 'PdfDocument', path: str | Path) -> None:
+        self._document = document
+        self._path = Path(path)
+
+    ##############################################
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def content_hash(self) -> str:
+        return self._document.content_hash
+
+    ##############################################
+
+    def _entry_path(self, page_index: int, flags: str) -> Path:
+        # marshal format depends on the Python version and the dict on the MuPDF version
+        name = f'{page_index:05}-{flags}-v{self.VERSION}-m{marshal.version}-f{fitz.VersionBind}{self.SUFFIX}'
+        return self._path.joinpath(self.content_hash, name)
+
+    ##############################################
+
+    def get(self, page_index: int, flags: str) -> dict | None:
+        """Return the text dict for the page or :obj:`None` if not cached"""
+        path = self._entry_path(page_index, flags)
+        try:
+            # Note: marshal.load(fh) reads the file by small chunks
+            return marshal.loads(path.read_bytes())
+        except FileNotFoundError:
+            return None
+        except (EOFError, ValueError, TypeError):
+            self._logger.warning(f"Invalid cache entry {path}")
+            return None
+
+    ##############################################
+
+    def set(self, page_index: int, flags: str, text: dict) -> None:
+        path = self._entry_path(page_index, flags)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write then rename so as a concurrent reader never sees a partial file
+        tmp_path = path.with_name(f'{path.name}.{os.getpid()}-{threading.get_ident()}.tmp')
+        try:
+            tmp_path.write_bytes(marshal.dumps(text))
+            os.replace(tmp_path, path)
+        except (OSError, ValueError) as exception:
+            self._logger.warning(f"Cannot write cache entry {path}: {exception}")
+            tmp_path.unlink(missing_ok=True)
@@ -18,18 +18,40 @@
 #
 ####################################################################################################
 
-"""This module implements a Least Recently Used cache using a bidirectional linked list.
+"""This module implements a thread safe cache having a size constraint and a pluggable eviction
+policy:
+
+* :class:`LruPolicy` evicts the Least Recently Used element first, it is implemented using a
+  bidirectional linked list and all the operations are O(1), excepted the recycling which must skip
+  the acquired elements.
+
+* :class:`LfuPolicy` evicts the Least Frequently Used element first, ties are broken by recency.
+
+* :class:`GdsfPolicy` implements the Greedy Dual Size Frequency algorithm which evicts first the
+  elements having a low frequency and a large size, it is suited for objects of very different
+  sizes like images.
+
+The last two policies use a priority queue and their operations are O(log n).
 
 """
 
 ####################################################################################################
 
-__all__ = ['LruCache']
+__all__ = [
+    'Cache',
+    'EvictionPolicy',
+    'GdsfPolicy',
+    'LfuPolicy',
+    'LruCache',
+    'LruPolicy',
+]
 
 ####################################################################################################
 
 from typing import Any, Iterator
+import heapq
 import logging
+import threading
 
 ####################################################################################################
 
@@ -65,13 +87,20 @@ class ObjectProtocol:
 
 class CacheElement:
 
-    """ This class implements a cache element of the LRU cache. """
+    """ This class implements a cache element. """
+
+    __slots__ = (
+        '_cache_manager', '_obj', 'key', '_size_in_cache', '_reference_counter',
+        # used by the policies
+        '_younger', '_older',
+        '_frequency', '_priority', '_sequence',
+    )
 
     _logger = logging.getLogger(__name__)
 
     ##############################################
 
-    def __init__(self, cache_manager: 'LruCache', obj: Any, acquire: bool = False) -> None:
+    def __init__(self, cache_manager: 'Cache', obj: Any, acquire: bool = False) -> None:
         """The stored object must implement the Object Protocol defined by the abstract class
         :class:`ObjectProtocol`.
 
@@ -85,12 +114,19 @@ class CacheElement:
         self._reference_counter = 1 if acquire else 0
         self._younger = None
         self._older = None
+        self._frequency = 1
+        self._priority = 0
+        self._sequence = None
 
     ##############################################
 
-    def __del__(self) -> None:
-        """Delete the stored object reference."""
-        self._logger.debug('Delete CacheElement {self.key}')   # + str(self._obj)
+    @property
+    def reference_counter(self) -> int:
+        return self._reference_counter
+
+    @property
+    def frequency(self) -> int:
+        return self._frequency
 
     ##############################################
 
@@ -103,77 +139,86 @@ class CacheElement:
 
     def release(self) -> None:
         """Decrement the reference counter."""
-        self._reference_counter -= 1
+        if self._reference_counter:
+            self._reference_counter -= 1
+        else:
+            self._logger.warning('Release CacheElement %s which is not acquired', self.key)
 
     ##############################################
 
     def detach(self) -> None:
         """Delete the data object reference."""
-        self._logger.debug('Detach CacheElement %s', str(self._obj))
+        # Note: don't log here, it is called for each recycled element
         # !# self._obj.free()
         del self._obj
 
 ####################################################################################################
 
-class LruCache:
+class EvictionPolicy:
 
-    """ This class implements the LRU cache. """
+    """This class defines the interface of an eviction policy.
 
-    _logger = logging.getLogger(__name__)
+    A policy orders the cache elements, it is only called by :class:`Cache` with the lock held.
 
-    ##############################################
+    """
 
-    def __init__(self, constraint: int) -> None:
-        self._constraint = constraint
-        self._cache_dict = {}
-        self._younger = None   # reference to the younger element
-        self._older = None   # reference to the older element
-        self._size = 0
+    NAME = None
 
     ##############################################
 
-    @property
-    def constraint(self) -> int:
-        """ Cache constraint. """
-        return self._constraint
+    def reset(self) -> None:
+        raise NotImplementedError
 
-    @constraint.setter
-    def constraint(self, constraint: int) -> None:
-        self._constraint = constraint
+    def add(self, cache_element: CacheElement) -> None:
+        """Called when an element is added."""
+        raise NotImplementedError
 
-    ##############################################
+    def access(self, cache_element: CacheElement) -> None:
+        """Called when an element is accessed, after its frequency was incremented."""
+        raise NotImplementedError
 
-    def __len__(self) -> int:
-        """Return the number of elements in the cache."""
-        return len(self._cache_dict)
+    def update(self, cache_element: CacheElement) -> None:
+        """Called when the size of an element changed."""
+        pass
 
-    ##############################################
+    def remove(self, cache_element: CacheElement) -> None:
+        """Called when an element is removed from the cache."""
+        raise NotImplementedError
 
-    def size(self) -> int:
-        """Return the cache size."""
-        return self._size
+    def victims(self) -> Iterator[CacheElement]:
+        """Iterate over the elements in eviction order.  The cache calls :meth:`remove` for the
+        evicted elements before to resume the iteration.
+
+        """
+        raise NotImplementedError
+
+    def elements(self) -> list[CacheElement]:
+        """Return the elements from the last to the first to be evicted."""
+        raise NotImplementedError
+
+####################################################################################################
+
+class LruPolicy(EvictionPolicy):
+
+    """This class implements the Least Recently Used policy using a bidirectional linked list."""
+
+    NAME = 'LRU'
 
     ##############################################
 
-    def __iter__(self) -> Iterator[CacheElement]:
-        """Iterate over the cache elements from the younger to the older."""
-        cache_element = self._younger
-        while cache_element is not None:
-            yield cache_element
-            cache_element = cache_element._older
+    def __init__(self) -> None:
+        self._younger = None   # reference to the younger element
+        self._older = None   # reference to the older element
 
     ##############################################
 
     def reset(self) -> None:
-        # Fixme: reset -> clear ?
-        """Reset the cache."""
-        # Break all the references and clear the dict
+        # Break all the references
+        cache_element = self._younger
+        while cache_element is not None:
+            cache_element._younger, cache_element = None, cache_element._older
         self._younger = None
         self._older = None
-        for cache_element in self._cache_dict.values():
-            del cache_element._younger
-            del cache_element._older
-        self._cache_dict.clear()
 
     ##############################################
 
@@ -208,78 +253,414 @@ class LruCache:
 
     ##############################################
 
-    def recycle(self) -> None:
-        """Recycle the cache."""
-        size_to_recover = self._size - self._constraint
-        self._logger.debug('Recycle: Size to recover %u', size_to_recover)
+    def add(self, cache_element: CacheElement) -> None:
+        self._push_element(cache_element)
+
+    def access(self, cache_element: CacheElement) -> None:
+        self._unlink_element(cache_element)
+        self._push_element(cache_element)
+
+    def remove(self, cache_element: CacheElement) -> None:
+        self._unlink_element(cache_element)
+
+    ##############################################
+
+    def victims(self) -> Iterator[CacheElement]:
         cache_element = self._older
-        while self._size > self._constraint and cache_element is not None:
-            if not cache_element._reference_counter:
-                self._unlink_element(cache_element)
-                del self._cache_dict[cache_element.key]
-                self._size -= cache_element._size_in_cache
-                cache_element.detach()   # so as to decrease the reference counter
-            cache_element = cache_element._younger
-            # unlinked cache_element should be deleted now by the garbage collector
+        while cache_element is not None:
+            # unlink doesn't modify the element references
+            younger = cache_element._younger
+            yield cache_element
+            cache_element = younger
+
+    ##############################################
+
+    def elements(self) -> list[CacheElement]:
+        cache_elements = []
+        cache_element = self._younger
+        while cache_element is not None:
+            cache_elements.append(cache_element)
+            cache_element = cache_element._older
+        return cache_elements
+
+####################################################################################################
+
+class PriorityPolicy(EvictionPolicy):
+
+    """This class implements a policy which evicts first the element having the lowest priority,
+    ties are broken by recency.
+
+    The priority queue is a heap with lazy deletion: an access pushes a new entry and the outdated
+    ones are skipped, the heap is compacted when it contains too many of them.
+
+    """
+
+    ##############################################
+
+    def __init__(self) -> None:
+        self.reset()
+
+    ##############################################
+
+    def reset(self) -> None:
+        self._heap = []
+        self._sequence = 0
+        self._number_of_elements = 0
+
+    ##############################################
+
+    def _priority(self, cache_element: CacheElement) -> float:
+        raise NotImplementedError
+
+    ##############################################
+
+    def _push(self, cache_element: CacheElement) -> None:
+        cache_element._priority = self._priority(cache_element)
+        self._sequence += 1
+        cache_element._sequence = self._sequence
+        heapq.heappush(self._heap, (cache_element._priority, self._sequence, cache_element))
+        if len(self._heap) > 2 * self._number_of_elements + 64:
+            self._compact()
+
+    ##############################################
+
+    def _compact(self) -> None:
+        self._heap = [_ for _ in self._heap if _[1] == _[2]._sequence]
+        heapq.heapify(self._heap)
+
+    ##############################################
+
+    def add(self, cache_element: CacheElement) -> None:
+        self._number_of_elements += 1
+        self._push(cache_element)
+
+    def access(self, cache_element: CacheElement) -> None:
+        self._push(cache_element)
+
+    def update(self, cache_element: CacheElement) -> None:
+        self._push(cache_element)
+
+    def remove(self, cache_element: CacheElement) -> None:
+        # invalidate the heap entries
+        cache_element._sequence = None
+        self._number_of_elements -= 1
+
+    ##############################################
+
+    def victims(self) -> Iterator[CacheElement]:
+        # the yielded elements are popped, the pinned ones are pushed back at the end
+        popped = []
+        try:
+            while self._heap:
+                entry = heapq.heappop(self._heap)
+                if entry[1] != entry[2]._sequence:
+                    # outdated entry
+                    continue
+                popped.append(entry)
+                yield entry[2]
+        finally:
+            for entry in popped:
+                cache_element = entry[2]
+                if entry[1] == cache_element._sequence:
+                    heapq.heappush(self._heap, entry)
+                else:
+                    self._evicted(cache_element)
+
+    ##############################################
+
+    def _evicted(self, cache_element: CacheElement) -> None:
+        pass
+
+    ##############################################
+
+    def elements(self) -> list[CacheElement]:
+        entries = [_ for _ in self._heap if _[1] == _[2]._sequence]
+        entries.sort(reverse=True, key=lambda _: _[:2])
+        return [_[2] for _ in entries]
+
+####################################################################################################
+
+class LfuPolicy(PriorityPolicy):
+
+    """This class implements the Least Frequently Used policy."""
+
+    NAME = 'LFU'
+
+    ##############################################
+
+    def _priority(self, cache_element: CacheElement) -> float:
+        return cache_element._frequency
+
+####################################################################################################
+
+class GdsfPolicy(PriorityPolicy):
+
+    """This class implements the Greedy Dual Size Frequency policy.
+
+    The priority of an element is ``L + frequency * cost / size`` where ``L`` is the priority of the
+    last evicted element, so as the elements which are no longer accessed age.  The cost is given by
+    the ``cost()`` method of the object if it is defined, else it is 1 and the policy favours the
+    small objects.
+
+    """
+
+    NAME = 'GDSF'
+
+    ##############################################
+
+    def reset(self) -> None:
+        super().reset()
+        self._inflation = 0
+
+    ##############################################
+
+    def _priority(self, cache_element: CacheElement) -> float:
+        obj = cache_element._obj
+        cost = obj.cost() if hasattr(obj, 'cost') else 1
+        return self._inflation + cache_element._frequency * cost / max(cache_element._size_in_cache, 1)
+
+    ##############################################
+
+    def _evicted(self, cache_element: CacheElement) -> None:
+        self._inflation = cache_element._priority
+
+####################################################################################################
+
+class Cache:
+
+    """ This class implements a cache having a size constraint.
+
+    The cache is recycled when an element is added, updated or released, until its size fits the
+    constraint.  The elements are evicted in the order defined by the *policy*, default is
+    :class:`LruPolicy`.  Acquired elements, i.e. having a non null reference counter, are pinned and
+    never recycled.
+
+    All the methods are thread safe.
+
+    """
+
+    _logger = logging.getLogger(__name__)
+
+    ##############################################
+
+    def __init__(self, constraint: int, policy: EvictionPolicy = None) -> None:
+        self._constraint = constraint
+        self._policy = policy if policy is not None else LruPolicy()
+        self._cache_dict = {}
+        self._size = 0
+        self._number_of_evictions = 0
+        self._lock = threading.Lock()
+
+    ##############################################
+
+    @property
+    def constraint(self) -> int:
+        """ Cache constraint. """
+        return self._constraint
+
+    @constraint.setter
+    def constraint(self, constraint: int) -> None:
+        with self._lock:
+            self._constraint = constraint
+            self._recycle()
+
+    ##############################################
+
+    @property
+    def policy(self) -> EvictionPolicy:
+        return self._policy
+
+    ##############################################
+
+    def __len__(self) -> int:
+        """Return the number of elements in the cache."""
+        return len(self._cache_dict)
+
+    ##############################################
+
+    def size(self) -> int:
+        """Return the cache size."""
+        return self._size
+
+    ##############################################
+
+    @property
+    def number_of_evictions(self) -> int:
+        """Return the number of recycled elements since the creation of the cache."""
+        return self._number_of_evictions
+
+    ##############################################
+
+    def __iter__(self) -> Iterator[CacheElement]:
+        """Iterate over the cache elements from the last to the first to be evicted."""
+        # iterate over a snapshot so as other threads can use the cache
+        with self._lock:
+            return iter(self._policy.elements())
+
+    ##############################################
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._cache_dict
+
+    ##############################################
+
+    def reset(self) -> None:
+        # Fixme: reset -> clear ?
+        """Reset the cache."""
+        with self._lock:
+            self._policy.reset()
+            self._cache_dict.clear()
+            self._size = 0
+
+    ##############################################
+
+    def _remove_element(self, cache_element: CacheElement) -> None:
+        self._policy.remove(cache_element)
+        del self._cache_dict[cache_element.key]
+        self._size -= cache_element._size_in_cache
+
+    ##############################################
+
+    def _recycle(self) -> int:
+        # must be called with the lock held
+        size_to_recover = self._size - self._constraint
+        if size_to_recover <= 0:
+            return 0
+        number_of_recycled_elements = 0
+        victims = self._policy.victims()
+        try:
+            for cache_element in victims:
+                if not cache_element._reference_counter:
+                    self._remove_element(cache_element)
+                    cache_element.detach()   # so as to decrease the reference counter
+                    number_of_recycled_elements += 1
+                    # unlinked cache_element should be deleted now by the garbage collector
+                    if self._size <= self._constraint:
+                        break
+        finally:
+            victims.close()
         # gc.collect()
+        self._number_of_evictions += number_of_recycled_elements
+        self._logger.debug(
+            'Recycle: %u bytes to recover, %u elements recycled',
+            size_to_recover, number_of_recycled_elements,
+        )
+        return number_of_recycled_elements
+
+    def recycle(self) -> int:
+        """Recycle the cache. Return the number of recycled elements."""
+        with self._lock:
+            return self._recycle()
 
     ##############################################
 
     def add(self, obj: Any, acquire: bool = False) -> None:
-        """Add an object *obj* in the cache, cf. :class:`CacheElement`."""
+        """Add an object *obj* in the cache, cf. :class:`CacheElement`.  An object having the same
+        key is replaced.
+
+        """
         cache_element = CacheElement(self, obj, acquire)
-        self._size += cache_element._size_in_cache
-        self._cache_dict[cache_element.key] = cache_element
-        self._push_element(cache_element)
+        with self._lock:
+            old_cache_element = self._cache_dict.get(cache_element.key)
+            if old_cache_element is not None:
+                self._remove_element(old_cache_element)
+            self._size += cache_element._size_in_cache
+            self._cache_dict[cache_element.key] = cache_element
+            self._policy.add(cache_element)
+            self._recycle()
 
     ##############################################
 
     def remove(self, key: str) -> None:
         """Remove an object referenced by its key."""
-        if key in self._cache_dict:
-            cache_element = self._cache_dict[key]
-            self._size -= cache_element.size_in_cache
-            self._unlink_element(cache_element)
-            del self._cache_dict[key]
+        with self._lock:
+            cache_element = self._cache_dict.get(key)
+            if cache_element is not None:
+                self._remove_element(cache_element)
+
+    ##############################################
+
+    def get(self, key: str) -> Any | None:
+        """Get an object referenced by its key. The access is notified to the policy, but its
+        reference counter is not modified. Return the object or :obj:`None` if the element is not
+        found.
+
+        """
+        with self._lock:
+            cache_element = self._cache_dict.get(key)
+            if cache_element is not None:
+                cache_element._frequency += 1
+                self._policy.access(cache_element)
+                return cache_element._obj
+            else:
+                return None
+
+    ##############################################
+
+    def update(self, key: str) -> None:
+        """Update the size of an object referenced by its key, e.g. when its content changed."""
+        with self._lock:
+            cache_element = self._cache_dict.get(key)
+            if cache_element is not None:
+                new_size = cache_element._obj.size()
+                self._size += new_size - cache_element._size_in_cache
+                cache_element._size_in_cache = new_size
+                self._policy.update(cache_element)
+                self._recycle()
 
     ##############################################
 
     def acquire(self, key: str) -> Any | None:
-        """Acquire an object referenced by its key. The object is moved on top of the list and its
-        reference counter is incremented. Return the :class:`CacheElement` instance or :obj:`None`
-        if the element is not found.
+        """Acquire an object referenced by its key. The access is notified to the policy and its
+        reference counter is incremented. Return the object or :obj:`None` if the element is not
+        found.
 
         """
-        if key in self._cache_dict:
-            cache_element = self._cache_dict[key]
-            self._unlink_element(cache_element)
-            self._push_element(cache_element)
-            return cache_element.acquire()
-        else:
-            return None
+        with self._lock:
+            cache_element = self._cache_dict.get(key)
+            if cache_element is not None:
+                cache_element._frequency += 1
+                self._policy.access(cache_element)
+                return cache_element.acquire()
+            else:
+                return None
 
     ##############################################
 
     def release(self, key: str) -> None:
         """Release an object referenced by its key. Its reference counter is decremented."""
-        if key in self._cache_dict:
-            cache_element = self._cache_dict[key]
-            cache_element.release()
+        with self._lock:
+            cache_element = self._cache_dict.get(key)
+            if cache_element is not None:
+                cache_element.release()
+                if not cache_element._reference_counter:
+                    self._recycle()
 
     ##############################################
 
     def __str__(self) -> str:
-        percent = rint(inverse_percent(self._size / float(self._constraint)))
-        text = f"""LRU cache:
-  size = {self._size} / {self._constraint} = {percent} %%
-  from the younger to the older
+        with self._lock:
+            percent = rint(inverse_percent(self._size / float(self._constraint)))
+            text = f"""{self._policy.NAME} cache:
+  size = {self._size} / {self._constraint} = {percent} %
+  from the last to the first to be evicted
 """
-        i = 0
-        for cache_element in self:
-            key = str(cache_element.key)
-            rc = cache_element._reference_counter
-            size = cache_element._size_in_cache
-            obj = str(cache_element._obj)
-            text += f'  [i:4] key={key} rc={rc} size={size} obj={obj}\n'
-            i += 1
-        return text
+            for i, cache_element in enumerate(self._policy.elements()):
+                key = str(cache_element.key)
+                rc = cache_element._reference_counter
+                size = cache_element._size_in_cache
+                frequency = cache_element._frequency
+                obj = str(cache_element._obj)
+                text += f'  [{i:4}] key={key} rc={rc} size={size} frequency={frequency} obj={obj}\n'
+            return text
+
+####################################################################################################
+
+class LruCache(Cache):
+
+    """ This class implements a Least Recently Used cache. """
+
+    ##############################################
+
+    def __init__(self, constraint: int) -> None:
+        super().__init__(constraint, LruPolicy())
@@ -18,10 +18,11 @@
 #
 ####################################################################################################
 
-__all__ = ['expand_path', 'find', 'walk']
+__all__ = ['expand_path', 'file_hash', 'find', 'walk']
 
 ####################################################################################################
 
+import hashlib
 import os
 from pathlib import Path
 from typing import Iterator
@@ -50,3 +51,14 @@ def walk(path: str, followlinks: bool = False) -> Iterator[Path]:
     for root, _, files in os.walk(path, followlinks=followlinks):
         for filename in files:
             yield Path(root).joinpath(filename)
+
+####################################################################################################
+
+def file_hash(path: str | Path, chunk_size: int = 1024**2) -> str:
+    """Return the SHA-256 of a file as an hexadecimal string"""
+    # Note: hashlib.file_digest requires Python 3.11
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        while chunk := fh.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -120,9 +120,10 @@ class QmlApplication(QObject):
         path = url.toString(QUrl.FormattingOptions(QUrl.RemoveScheme))
         self._logger.info('Load pdf {path} ...')
         self._pdf = QmlPdf(path)
+        self._application.page_image_provider.document = self._pdf.document
         self._logger.info('Pdf loaded')
         # Fixme: use signal to propagate a new path ?
-        self._tabula_extractor.path = path
+        self._tabula_extractor.document = self._pdf.document
         self.pdf_changed.emit()
 
     ##############################################
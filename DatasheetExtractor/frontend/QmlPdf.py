@@ -28,17 +28,19 @@ __all__ = [
 ####################################################################################################
 
 from pathlib import Path
+from typing import Callable, Optional
 import glob
 import logging
+import math
 import subprocess
 import time
-import uuid
 
 from qtpy.QtCore import (
     Property, Signal, Slot, QObject,
     Qt,
-    QTimer, QUrl,
-    QCoreApplication
+    QSize, QTimer, QUrl,
+    QCoreApplication,
+    QStandardPaths,
 )
 from qtpy.QtGui import QImage, QPixmap
 from qtpy.QtQml import QmlElement, QmlUncreatable
@@ -51,7 +53,8 @@ import markdown
 #! from DatasheetExtractor.Thumbnail import FreeDesktopThumbnailCache # Fixme: Linux only
 from DatasheetExtractor.backend.pdf.document import PdfDocument
 from DatasheetExtractor.backend.pdf.page import PdfPage
-#! from .Runnable import Worker
+from DatasheetExtractor.common.LruCache import LruCache
+from .Runnable import Worker
 
 ####################################################################################################
 
@@ -69,47 +72,218 @@ _module_logger = logging.getLogger(__name__)
 
 ####################################################################################################
 
+class PageImage:
+
+    """Cache object for a rendered page"""
+
+    ##############################################
+
+    def __init__(self, key: tuple, image: QImage) -> None:
+        self._key = key
+        self.image = image
+
+    ##############################################
+
+    def key(self) -> tuple:
+        return self._key
+
+    def size(self) -> int:
+        return self.image.sizeInBytes()
+
+####################################################################################################
+
 class PageImageProvider(QQuickImageProvider):
 
+    """This class provides the rendered pages to QML.
+
+    An image id has the form ``page/dpi/rotation``, rotation is optional, a tile of the page has the
+    form ``page/dpi/rotation/x0_y0_x1_y1`` where the clip is in point.  If a size is requested,
+    e.g. using the ``sourceSize`` of an ``Image``, the closest render having a sufficient resolution
+    is used, else the page is rendered at the needed resolution.  Images are kept in a LRU cache, so
+    as thumbnails and views at different zoom levels coexist.  It is the only memory tier, the
+    renders don't fill the memory tier of :class:`PdfImageCache`, cf. :meth:`PdfImageCache.render`.
+
+    """
+
     _logger = _module_logger.getChild('PageImageProvider')
 
+    CACHE_SIZE = 256 * 1024**2   # bytes
+    MAX_DPI = 600
+
     ##############################################
 
     def __init__(self) -> None:
         # super().__init__(QQuickImageProvider.Image) # Pixmap
         super().__init__(QQuickImageProvider.ImageType.Image)
-        self._output = None
+        # images are added by the render workers and requested by the QML image loader thread,
+        # the cache is thread safe
+        self._cache = LruCache(constraint=self.CACHE_SIZE)
+        self._document = None
 
     ##############################################
 
     @property
-    def output(self):
-        return self._output
+    def document(self) -> PdfDocument:
+        return self._document
+
+    @document.setter
+    def document(self, document: PdfDocument) -> None:
+        self._document = document
+        self._cache.reset()
+
+    ##############################################
+
+    @staticmethod
+    def image_id(
+            page_number: int,
+            dpi: int,
+            rotation: int = 0,
+            clip: Optional[tuple[float, float, float, float]] = None,
+    ) -> str:
+        image_id = f'{page_number}/{dpi}/{rotation}'
+        if clip is not None:
+            image_id += '/' + '_'.join(f'{_:.1f}' for _ in clip)
+        return image_id
+
+    @staticmethod
+    def parse_image_id(image_id: str) -> tuple[int, int, int, Optional[tuple[float, ...]]]:
+        """Return the page number, dpi, rotation and clip"""
+        parts = image_id.split('/')
+        page_number, dpi = int(parts[0]), int(parts[1])
+        rotation = int(parts[2]) if len(parts) > 2 else 0
+        if len(parts) > 3:
+            clip = tuple(float(_) for _ in parts[3].split('_'))
+            if len(clip) != 4:
+                raise ValueError(f'Invalid clip {parts[3]}')
+        else:
+            clip = None
+        return page_number, dpi, rotation, clip
+
+    ##############################################
 
-    @output.setter
-    def output(self, image):
-        # self._output = ImageQt.ImageQt(Image.fromarray(image))
+    @staticmethod
+    def to_qimage(pixmap: 'fitz.Pixmap') -> QImage:
         fmt = (
             QImage.Format.Format_RGBA8888
-            if image.alpha
+            if pixmap.alpha
             else QImage.Format.Format_RGB888
         )
         # .samples_mv crash !
-        self._output = QImage(image.samples, image.width, image.height, image.stride, fmt)
+        # copy so as the image owns its data
+        return QImage(pixmap.samples, pixmap.width, pixmap.height, pixmap.stride, fmt).copy()
+
+    ##############################################
+
+    @property
+    def cache_size(self) -> int:
+        return self._cache.constraint
+
+    ##############################################
+
+    def add_image(self, image_id: str, pixmap: 'fitz.Pixmap') -> None:
+        """Add a rendered pixmap, this method can be called from any thread."""
+        key = self.parse_image_id(image_id)
+        self._cache.add(PageImage(key, self.to_qimage(pixmap)))
+
+    def __contains__(self, image_id: str) -> bool:
+        return self.parse_image_id(image_id) in self._cache
+
+    ##############################################
+
+    def _closest(self, page_number: int, dpi: int, rotation: int) -> Optional[QImage]:
+        """Return the render of the page having the lowest resolution greater than *dpi*"""
+        closest_key = None
+        for cache_element in self._cache:
+            _page_number, _dpi, _rotation, clip = key = cache_element.key
+            if clip is None and _page_number == page_number and _rotation == rotation and _dpi >= dpi:
+                if closest_key is None or _dpi < closest_key[1]:
+                    closest_key = key
+        if closest_key is not None:
+            page_image = self._cache.get(closest_key)
+            if page_image is not None:
+                return page_image.image
+        return None
+
+    ##############################################
+
+    def _render(
+            self,
+            page_number: int,
+            dpi: int,
+            rotation: int,
+            clip: Optional[tuple[float, ...]] = None,
+    ) -> QImage:
+        self._logger.info(f'render page {page_number} at {dpi} dpi clip {clip}')
+        # the image is only kept by the provider cache, cf. PdfImageCache.render
+        pixmap = self._document.image_cache.render(page_number, dpi=dpi, rotation=rotation, clip=clip)
+        image = self.to_qimage(pixmap)
+        self._cache.add(PageImage((page_number, dpi, rotation, clip), image))
+        return image
+
+    ##############################################
+
+    def _dpi_for_size(self, page_number: int, rotation: int, size: QSize) -> int:
+        page = self._document[page_number]
+        width = PdfPage.from_scaled(page.width)
+        height = PdfPage.from_scaled(page.height)
+        if rotation % 180:
+            width, height = height, width
+        scale = max(size.width() / width, size.height() / height)
+        return min(math.ceil(scale * 72), self.MAX_DPI)
+
+    ##############################################
+
+    def _scale(self, image: QImage, size: QSize) -> QImage:
+        if size.width() > 0 and size.height() > 0:
+            return image.scaled(size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+        elif size.width() > 0:
+            return image.scaledToWidth(size.width(), Qt.TransformationMode.SmoothTransformation)
+        else:
+            return image.scaledToHeight(size.height(), Qt.TransformationMode.SmoothTransformation)
+
+    ##############################################
+
+    def _image(self, image_id: str, requested_size: Optional[QSize] = None) -> QImage:
+        try:
+            page_number, dpi, rotation, clip = self.parse_image_id(image_id)
+        except (IndexError, ValueError):
+            self._logger.warning(f'Invalid image id {image_id}')
+            return QImage()
+        if clip is not None:
+            # a tile is not scaled
+            page_image = self._cache.get((page_number, dpi, rotation, clip))
+            if page_image is not None:
+                return page_image.image
+            if self._document is None:
+                return QImage()
+            return self._render(page_number, dpi, rotation, clip)
+        sized = requested_size is not None and (requested_size.width() > 0 or requested_size.height() > 0)
+        if sized and self._document is not None:
+            dpi = self._dpi_for_size(page_number, rotation, requested_size)
+        image = self._closest(page_number, dpi, rotation)
+        if image is None:
+            if self._document is None:
+                self._logger.warning(f'Unknown image {image_id}')
+                return QImage()
+            image = self._render(page_number, dpi, rotation)
+        if sized:
+            image = self._scale(image, requested_size)
+        return image
 
     ##############################################
 
     def requestImage(self, image_id, size, requested_size):
         self._logger.info(f'{image_id} {size} {requested_size}')
-        return self._output # , self._output.size()
+        return self._image(image_id, requested_size)
 
     ##############################################
 
-    def requestPixmap(self, image_id, size):
+    def requestPixmap(self, image_id, size, requested_size):
         self._logger.info('{} {}'.format(image_id, size))
-        pixmap = QPixmap(self._output.size())
-        pixmap.convertFromImage(self._output)
-        return pixmap, pixmap.size()
+        image = self._image(image_id, requested_size)
+        pixmap = QPixmap(image.size())
+        pixmap.convertFromImage(image)
+        return pixmap
 
 ####################################################################################################
 
@@ -307,9 +481,13 @@ class QmlPdfPage(QObject):
     def __init__(self, qml_pdf: 'QmlPdf', pdf_page: PdfPage) -> None:
         super().__init__()
         self._qml_pdf = qml_pdf
-        self._page = pdf_page
+        # the page is retrieved from the document page cache, so as the viewer doesn't keep alive
+        # the text and display list of every visited page
+        self._page_number = pdf_page.number
+        # page size in scaled unit, so as the viewer doesn't need to load the page
+        self._size = (pdf_page.width, pdf_page.height)
         self._text = None
-        self._logger.info(f'Qml Page {self._page.number}')
+        self._logger.info(f'Qml Page {self._page_number}')
 
     ##############################################
 
@@ -319,13 +497,18 @@ class QmlPdfPage(QObject):
     ##############################################
 
     def __repr__(self) -> str:
-        return '{0} {1}'.format(self.__class__.__name__, self._page)
+        return '{0} {1}'.format(self.__class__.__name__, self._page_number)
 
     ##############################################
 
     @property
     def page(self) -> PdfPage:
-        return self._page
+        return self._qml_pdf.document[self._page_number]
+
+    @property
+    def size(self) -> tuple[int, int]:
+        """Return the page width and height in scaled unit"""
+        return self._size
 
     ##############################################
 
@@ -360,31 +543,47 @@ class QmlPdfPage(QObject):
 
     @Property(int, notify=page_number_changed)
     def page_number(self) -> int:
-        return self._page.number
+        return self._page_number
 
     ##############################################
 
-    @Slot(result=str)
-    def generate_pixmap(self) -> str:
+    pixmap_ready = Signal(str)
+
+    @Slot()
+    def generate_pixmap(self) -> None:
+        """Render the page in the thread pool, :attr:`pixmap_ready` is emitted with the image id
+        when an image is available from the page image provider: first a low resolution preview,
+        then the final render.
+
+        """
         self._logger.info(f'generate pixmap for page {self.page_number}')
-        from .Application import Application
-        image = self._page.pixmap(dpi=300)
-        # Fixme: instance is not available at startup
-        Application.instance.page_image_provider.output = image
-        return str(uuid.uuid1())
+        self._qml_pdf.render_page(self)
 
-        # def job():
-        #     image = self._scanner.scan_image()
-        #     Application.instance.page_image_provider.output = image
-        #     return str(uuid.uuid1())
+    @Slot(str)
+    def _on_pixmap_rendered(self, image_id: str) -> None:
+        # called in the GUI thread, the result of a stale request is ignored
+        if self._qml_pdf.accept_render(image_id):
+            self.pixmap_ready.emit(image_id)
+        else:
+            self._logger.info(f'drop stale render {image_id}')
 
-        # worker = Worker(job)
-        # worker.signals.result.connect(self.preview_done)
-        # # worker.signals.finished.connect()
-        # # worker.signals.progress.connect()
+    ##############################################
 
-        # from .QmlApplication import Application
-        # Application.instance.thread_pool.start(worker)
+    tile_ready = Signal(str)
+
+    @Slot(float, float, float, float, float, result=bool)
+    def generate_tile(self, x0: float, y0: float, x1: float, y1: float, scale: float) -> bool:
+        """Render a region of the page in the thread pool for a zoom *scale* relative to the page
+        image, the region is given as fractions of the page size.  :attr:`tile_ready` is emitted
+        with the image id when the image is available.  Return false if a tile is not needed.
+
+        """
+        return self._qml_pdf.render_tile(self, (x0, y0, x1, y1), scale)
+
+    @Slot(str)
+    def _on_tile_rendered(self, image_id: str) -> None:
+        if self._qml_pdf.accept_tile(image_id):
+            self.tile_ready.emit(image_id)
 
     ##############################################
 
@@ -446,14 +645,30 @@ class QmlPdf(QObject):
 
     _logger = _module_logger.getChild('QmlPdf')
 
+    RENDER_DPI = 300
+    # a preview is rendered in tens of milliseconds
+    PREVIEW_DPI = 60
+    MAX_TILE_DPI = 1200
+    # number of pages prefetched before and after the current page
+    PREFETCH_DISTANCE = 3
+
     ##############################################
 
     def __init__(self, path: str) -> None:
         super().__init__()
-        self._pdf = PdfDocument(path)
+        cache_path = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.CacheLocation)
+        self._pdf = PdfDocument(path, cache_path=cache_path, image_disk_cache=True)
         self._metadata = QmlPdfMetadata(self._pdf)
-        # We must prevent garbage collection
+        # We must prevent garbage collection, a QmlPdfPage doesn't hold the PdfPage
         self._pages = {}
+        # workers by channel, i.e. page and tile, then by signals, cf. _on_worker_done
+        self._workers = {}
+        # cancelled workers which are running, referenced until they are done
+        self._cancelled_workers = {}
+        self._render_page_number = None
+        self._page_dpi = self.RENDER_DPI
+        self._render_dpi = 0
+        self._tile_image_id = None
 
     ##############################################
 
@@ -502,6 +717,168 @@ class QmlPdf(QObject):
 
     ##############################################
 
+    @property
+    def document(self) -> PdfDocument:
+        return self._pdf
+
+    ##############################################
+
+    def _cancel(self, channel: str) -> None:
+        from .Application import Application
+        thread_pool = Application.instance.thread_pool
+        for signals, worker in self._workers.pop(channel, {}).items():
+            # remove the request if it is not yet started, else its result is dropped
+            if thread_pool.tryTake(worker):
+                self._logger.info(f'cancel {channel} worker')
+            else:
+                # the pool doesn't own the worker, cf. _start
+                self._cancelled_workers[signals] = worker
+
+    def _start(self, channel: str, job: Callable[[], str], slot: Callable, priority: int = 0) -> None:
+        from .Application import Application
+        worker = Worker(job)
+        # the worker is owned by Python so as tryTake can be called after it ran
+        worker.setAutoDelete(False)
+        # the slot is a method of an object living in the GUI thread, thus it is queued
+        worker.signals.result.connect(slot)
+        worker.signals.done.connect(self._on_worker_done)
+        self._workers.setdefault(channel, {})[worker.signals] = worker
+        Application.instance.thread_pool.start(worker, priority)
+
+    @Slot()
+    def _on_worker_done(self) -> None:
+        # called in the GUI thread as _cancel, thus a worker is dropped once
+        signals = self.sender()
+        self._cancelled_workers.pop(signals, None)
+        for workers in self._workers.values():
+            workers.pop(signals, None)
+
+    ##############################################
+
+    def render_page(self, qml_page: QmlPdfPage, dpi: int = RENDER_DPI) -> None:
+        """Render a page in the thread pool, a low resolution preview is rendered first with a
+        higher priority.  The pending requests are cancelled, since the user flips pages faster than
+        the renders complete.
+
+        """
+        from .Application import Application
+        # Fixme: instance is not available at startup
+        provider = Application.instance.page_image_provider
+        self._cancel('page')
+        self._cancel('tile')
+        self._cancel('prefetch')
+        self._tile_image_id = None
+        page_number = qml_page.page_number
+        self._render_page_number = page_number
+        self._page_dpi = dpi
+        self._render_dpi = 0
+        image_id = provider.image_id(page_number, dpi)
+        self._prefetch(page_number, qml_page.size, dpi)
+        if image_id in provider:
+            qml_page._on_pixmap_rendered(image_id)
+            return
+
+        def job(image_id: str, dpi: int) -> str:
+            pixmap = self._pdf.image_cache.render(page_number, dpi=dpi)
+            provider.add_image(image_id, pixmap)
+            return image_id
+
+        preview_image_id = provider.image_id(page_number, self.PREVIEW_DPI)
+        if preview_image_id in provider:
+            qml_page._on_pixmap_rendered(preview_image_id)
+        else:
+            self._start('page', lambda: job(preview_image_id, self.PREVIEW_DPI), qml_page._on_pixmap_rendered, 1)
+        self._start('page', lambda: job(image_id, dpi), qml_page._on_pixmap_rendered)
+
+    def _prefetch(self, page_number: int, page_size: tuple[int, int], dpi: int) -> None:
+        """Render and extract the text of the neighbour pages with a low priority, the next pages
+        first.  The number of pages is bounded by half the image provider budget.
+
+        """
+        from .Application import Application
+        provider = Application.instance.page_image_provider
+        # Loading a page takes the document lock, which is held by the workers during a text
+        # extraction, thus the neighbour pages are only loaded in the jobs and their image size is
+        # estimated from the current page, as a RGB image
+        width, height = [int(PdfPage.from_scaled(_) * dpi / 72) for _ in page_size]
+        size = 3 * width * height
+        budget = provider.cache_size // 2
+        page_numbers = []
+        for distance in range(1, self.PREFETCH_DISTANCE + 1):
+            for _ in (page_number + distance, page_number - distance):
+                if self._pdf.first_page_number <= _ <= self._pdf.last_page_number:
+                    page_numbers.append(_)
+        for _ in page_numbers:
+            budget -= size
+            if budget < 0:
+                break
+            image_id = provider.image_id(_, dpi)
+            if image_id in provider:
+                continue
+
+            def job(page_number: int = _, image_id: str = image_id) -> str:
+                pixmap = self._pdf.image_cache.render(page_number, dpi=dpi)
+                provider.add_image(image_id, pixmap)
+                # extract the text, the page is kept in the document page cache
+                self._pdf[page_number].span_table()
+                return image_id
+
+            self._start('prefetch', job, self._on_prefetched, -1)
+
+    @Slot(str)
+    def _on_prefetched(self, image_id: str) -> None:
+        self._logger.info(f'prefetched {image_id}')
+
+    def accept_render(self, image_id: str) -> bool:
+        """Accept a render of the current page having a higher resolution than the displayed one"""
+        from .Application import Application
+        provider = Application.instance.page_image_provider
+        page_number, dpi, *_ = provider.parse_image_id(image_id)
+        if page_number == self._render_page_number and dpi > self._render_dpi:
+            self._render_dpi = dpi
+            return True
+        return False
+
+    ##############################################
+
+    def render_tile(self, qml_page: QmlPdfPage, region: tuple[float, float, float, float], scale: float) -> bool:
+        """Render a region of the page at the resolution of the zoom *scale*."""
+        from .Application import Application
+        provider = Application.instance.page_image_provider
+        self._cancel('tile')
+        dpi = min(int(self._page_dpi * scale), self.MAX_TILE_DPI)
+        if qml_page.page_number != self._render_page_number or dpi <= self._page_dpi:
+            # the page image is sufficient
+            self._tile_image_id = None
+            return False
+        width, height = [PdfPage.from_scaled(_) for _ in qml_page.size]
+        x0, y0, x1, y1 = region
+        clip = (x0 * width, y0 * height, x1 * width, y1 * height)
+        image_id = provider.image_id(qml_page.page_number, dpi, clip=clip)
+        self._tile_image_id = image_id
+        if image_id in provider:
+            qml_page._on_tile_rendered(image_id)
+            return True
+
+        def job() -> str:
+            # the clip is rounded in the image id
+            _, _, _, clip = provider.parse_image_id(image_id)
+            pixmap = self._pdf.image_cache.render(qml_page.page_number, dpi=dpi, clip=clip)
+            provider.add_image(image_id, pixmap)
+            return image_id
+
+        self._start('tile', job, qml_page._on_tile_rendered)
+        return True
+
+    def accept_tile(self, image_id: str) -> bool:
+        return image_id == self._tile_image_id
+
+    @Property(int, constant=True)
+    def render_dpi(self) -> int:
+        return self.RENDER_DPI
+
+    ##############################################
+
     # pages_changed = Signal()
 
     # @Property(QQmlListProperty, notify=pages_changed)
@@ -28,10 +28,15 @@ import logging
 
 import pandas as pd
 
-from qtpy.QtCore import Property, Signal, Slot, QObject, Qt, QAbstractTableModel, QModelIndex
+from qtpy.QtCore import (
+    Property, Signal, Slot, QObject, Qt, QAbstractTableModel, QModelIndex,
+    QStandardPaths,
+)
 from qtpy.QtQml import QmlElement, QmlUncreatable
 
+from DatasheetExtractor.backend.extractor.job_control import ExtractionCancelled, JobControl
 from DatasheetExtractor.backend.extractor.tabula import TabulaExtractor
+from DatasheetExtractor.backend.pdf.document import PdfDocument
 from DatasheetExtractor.common.backup import backup_file
 from .Runnable import Worker
 from .PandasModel import PandasModel
@@ -61,12 +66,21 @@ class QmlTabulaExtractor(QObject):
 
     def __init__(self) -> None:
         super().__init__()
+        self._document = None
         self._path = None
+        self._extractor = None
+        # extraction jobs by id, the last one is the current job
+        self._job_id = 0
+        self._jobs = {}
+        # results set by the worker threads and read in the GUI thread
+        self._results = {}
+        self._progress = 0
         self._page_number = None
         self._df = None
         self._table = PandasModel()
         self._suffix = self.SUFFIX
         self._suffix_error_message = ''
+        self._error_message = ''
 
     ##############################################
 
@@ -74,9 +88,24 @@ class QmlTabulaExtractor(QObject):
     def path(self) -> str:
         return str(self._path)
 
-    @path.setter
-    def path(self, value: str) -> None:
-        self._path = Path(value)
+    @property
+    def document(self) -> PdfDocument:
+        return self._document
+
+    @document.setter
+    def document(self, document: PdfDocument) -> None:
+        self._document = document
+        self._path = Path(document.path)
+        if self._extractor is not None:
+            self._extractor.close()
+        # keep the document open in the JVM for the next extractions
+        cache_path = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.CacheLocation)
+        self._extractor = TabulaExtractor(
+            self._path,
+            cache_path=cache_path,
+            # the file is already hashed for the image cache
+            content_hash=document.content_hash,
+        )
 
     ##############################################
 
@@ -95,6 +124,20 @@ class QmlTabulaExtractor(QObject):
 
     ##############################################
 
+    error_message_changed = Signal()
+
+    @Property(str, notify=error_message_changed)
+    def error_message(self) -> str:
+        """Error of the last extraction job"""
+        return self._error_message
+
+    def _set_error_message(self, value: str) -> None:
+        if self._error_message != value:
+            self._error_message = value
+            self.error_message_changed.emit()
+
+    ##############################################
+
     suffix_changed = Signal()
 
     @Property(str, notify=suffix_changed)
@@ -142,6 +185,38 @@ class QmlTabulaExtractor(QObject):
 
     # done = Signal()
     table_changed = Signal()
+    busy_changed = Signal()
+    progress_changed = Signal()
+
+    @Property(bool, notify=busy_changed)
+    def busy(self) -> bool:
+        return self._job_id in self._jobs
+
+    @Property(int, notify=progress_changed)
+    def progress(self) -> int:
+        return self._progress
+
+    def _set_progress(self, value: int) -> None:
+        if self._progress != value:
+            self._progress = value
+            self.progress_changed.emit()
+
+    ##############################################
+
+    @Slot()
+    def cancel(self) -> None:
+        """Cancel the pending jobs"""
+        from .Application import Application
+        thread_pool = Application.instance.thread_pool
+        for job_id, (worker, control) in list(self._jobs.items()):
+            control.cancel()
+            # remove the request if it is not yet started, else the job aborts as soon as possible
+            if thread_pool.tryTake(worker):
+                self._logger.info(f'cancel job {job_id}')
+                del self._jobs[job_id]
+        self.busy_changed.emit()
+
+    ##############################################
 
     # Fixme: 'QList<int>' ok ?
     @Slot(int, float, float, float, float, bool)
@@ -156,32 +231,97 @@ class QmlTabulaExtractor(QObject):
             lattice: bool = True,
             # to_csv: bool = False
     ) -> None:
-        self._logger.info(f'page {page_number} [{left:3.0f}, {right:3.0f}]x[{top:3.0f}, {bottom:3.0f}] lattice {lattice}')
+        self._logger.info(
+            f'page {page_number} [{left:3.0f}, {right:3.0f}]x[{top:3.0f}, {bottom:3.0f}] lattice {lattice}'
+        )
         from .Application import Application
-        def job() -> None:
-            _ = TabulaExtractor(self._path)
-            data_frames = _.extract(
-                page_number=page_number,
-                guess=False,
-                relative_area=(top, left, bottom, right),
-                scaled_by_100=True,
-                lattice=lattice,
-                to_csv=False,
-            )
-            self._page_number = page_number
-            self._df = data_frames
-            self._table.update(data_frames[0])
-            return f'{page_number}'
+        # a new selection supersedes the pending jobs, so as they don't pile up
+        self.cancel()
+        self._job_id += 1
+        job_id = self._job_id
+        extractor = self._extractor
+
+        def progress(value: int) -> None:
+            # stale jobs don't report
+            if job_id == self._job_id:
+                worker.signals.progress.emit(value)
+
+        control = JobControl(progress)
+
+        def job() -> str:
+            try:
+                data_frames = extractor.extract(
+                    page_number=page_number,
+                    guess=False,
+                    relative_area=(top, left, bottom, right),
+                    scaled_by_100=True,
+                    lattice=lattice,
+                    to_csv=False,
+                    control=control,
+                )
+                self._results[job_id] = (page_number, data_frames)
+            except ExtractionCancelled:
+                self._logger.info(f'job {job_id} cancelled')
+            return f'{job_id}'
 
         worker = Worker(job)
-        # worker.signals.result.connect(self.result)
-        worker.signals.done.connect(self.table_changed)
-        # worker.signals.progress.connect(self.progress_fn)
-
+        # the worker is owned by Python so as tryTake can be called after it ran
+        worker.setAutoDelete(False)
+        # the slots are methods of an object living in the GUI thread, thus they are queued
+        worker.signals.progress.connect(self._on_progress)
+        worker.signals.result.connect(self._on_result)
+        worker.signals.error.connect(self._on_error)
+        worker.signals.done.connect(self._on_done)
+        self._jobs[job_id] = (worker, control)
+        self._set_progress(0)
+        self._set_error_message('')
+        self.busy_changed.emit()
         Application.instance.thread_pool.start(worker)
 
     ##############################################
 
+    @Slot(int)
+    def _on_progress(self, value: int) -> None:
+        self._set_progress(value)
+
+    @Slot(str)
+    def _on_result(self, job_id: str) -> None:
+        job_id = int(job_id)
+        result = self._results.pop(job_id, None)
+        if job_id != self._job_id or result is None:
+            # superseded or cancelled
+            return
+        self._page_number, data_frames = result
+        self._df = data_frames
+        if data_frames:
+            self._table.update(data_frames[0])
+        self.table_changed.emit()
+
+    def _pop_job(self, signals: QObject) -> int | None:
+        for job_id, (worker, control) in list(self._jobs.items()):
+            if worker.signals is signals:
+                del self._jobs[job_id]
+                self._results.pop(job_id, None)
+                return job_id
+        return None
+
+    @Slot(tuple)
+    def _on_error(self, error: tuple) -> None:
+        # e.g. Java is missing, a JVM exception
+        exctype, value, backtrace = error
+        job_id = self._pop_job(self.sender())
+        self._logger.error(f'job {job_id} failed: {value}')
+        if job_id == self._job_id:
+            self._set_error_message(f'{exctype.__name__}: {value}')
+        self.busy_changed.emit()
+
+    @Slot()
+    def _on_done(self) -> None:
+        self._pop_job(self.sender())
+        self.busy_changed.emit()
+
+    ##############################################
+
     # Use QObject type instead of PandasModel else
     #   QMetaProperty::read: Unable to handle unregistered datatype 'QAbstractTableModel*'
     #   for property 'QmlTabulaExtractor::table'
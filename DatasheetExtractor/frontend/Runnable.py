@@ -28,7 +28,7 @@ __all__ = ['Worker']
 ####################################################################################################
 
 import logging
-# import sys
+import sys
 import traceback
 from typing import Callable
 
@@ -115,10 +115,9 @@ class Worker(QRunnable):
             )
         except Exception:
             traceback.print_exc()
-            # exctype, value = sys.exc_info()[:2]
+            exctype, value = sys.exc_info()[:2]
             self._logger.info('emit error')
-            # Fixme: (exctype, value, traceback.format_exc())
-            self._signals.error.emit()
+            self._signals.error.emit((exctype, value, traceback.format_exc()))
         else:
             self._logger.info(f'emit result {result}')
             self._signals.result.emit(result)
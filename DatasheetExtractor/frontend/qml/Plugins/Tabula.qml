@@ -49,7 +49,6 @@ Item {
         // Fixme:
         var bounds_pc = selection_area.bounds_pc()
         console.log('Start processing of page ', page_number)
-        busy_indicator.running = true
         tabula_extractor.process_page_area(
             page_number,
             bounds_pc.y_inf,
@@ -62,7 +61,6 @@ Item {
 
     function on_done() {
         console.log('Tabula done')
-        busy_indicator.running = false
     }
 
     function save() {
@@ -114,6 +112,17 @@ Item {
                 onClicked: save()
                 enabled: textarea.text && !error_message.text
             }
+
+            Controls.CustomButton {
+                Layout.preferredHeight: 30
+                font.pixelSize: 20
+                font.bold: true
+                color_label: 'white'
+                color_background: Style.color.danger
+                text: qsTr('Cancel')
+                onClicked: tabula_extractor.cancel()
+                enabled: tabula_extractor.busy
+            }
         }
 
         RowLayout {
@@ -148,12 +157,28 @@ Item {
             text: qsTr("Use ruling lines separating each cell")
         }
 
-        BusyIndicator {
-            id: busy_indicator
-            Layout.preferredWidth: Math.min(64, root.width / 2)
-            Layout.preferredHeight: Layout.preferredWidth
-            running: false
-            visible: running
+        RowLayout {
+            spacing: 20
+            visible: busy_indicator.running
+
+            BusyIndicator {
+                id: busy_indicator
+                Layout.preferredWidth: Math.min(64, root.width / 2)
+                Layout.preferredHeight: Layout.preferredWidth
+                running: tabula_extractor.busy
+            }
+
+            ProgressBar {
+                from: 0
+                to: 100
+                value: tabula_extractor.progress
+            }
+        }
+
+        Label {
+            visible: text
+            color: Style.color.danger
+            text: tabula_extractor.error_message
         }
 
         ScrollView {
@@ -57,9 +57,9 @@ Widgets.ImageViewer {
             console.info('before pdf.page')
             pdf_page = pdf.page(page_number)
             console.info('after pdf.page', pdf_page)
-            var path = pdf_page.generate_pixmap()
-            // console.info("pixmap ", path)
-            image_source = 'image://page_image/' + path
+            // the page is rendered asynchronously, cf. onPixmap_ready
+            clear_tile()
+            pdf_page.generate_pixmap()
             page_changed()
         }
     }
@@ -84,11 +84,36 @@ Widgets.ImageViewer {
 
     // image_source: pdf_page ? pdf_page.path : ''
     image_source: ''
+    tile_enabled: true
+
+    // region of the requested tile
+    property rect pending_tile_region
+
+    onTile_requested: {
+        pending_tile_region = Qt.rect(x0, y0, x1 - x0, y1 - y0)
+        if (!pdf_page.generate_tile(x0, y0, x1, y1, zoom))
+            clear_tile()
+    }
 
     Component.onCompleted: {
         pdf.new_page.connect(last_page)
     }
 
+    Connections {
+        target: page_viewer.pdf_page
+        ignoreUnknownSignals: true
+        function onPixmap_ready(image_id) {
+            // console.info("pixmap ", image_id)
+            // a preview is received first, then the final render
+            var dpi = parseInt(image_id.split('/')[1])
+            set_image_source('image://page_image/' + image_id, pdf.render_dpi / dpi)
+        }
+        function onTile_ready(image_id) {
+            tile_region = pending_tile_region
+            tile_source = 'image://page_image/' + image_id
+        }
+    }
+
     /*
     onMovementEnded: {
         // Fixme: this simple implementation has issues
@@ -35,6 +35,29 @@ Flickable {
     property string image_source
     property int image_rotation
 
+    // Scale of the image source relative to the displayed size, e.g. for a low resolution preview,
+    // it is applied when the new source is loaded
+    property real image_source_scale: 1.0
+
+    // A tile is a high resolution image of a region, displayed over the image when zoomed in
+    property bool tile_enabled: false
+    property string tile_source: ''
+    // region of the tile as fractions of the image size
+    property rect tile_region: Qt.rect(0, 0, 0, 0)
+
+    // Emitted when the view stops to move and the image is zoomed in,
+    // the visible region is given as fractions of the image size
+    signal tile_requested(real x0, real y0, real x1, real y1, real zoom)
+
+    function set_image_source(source, source_scale) {
+        image.pending_source_scale = source_scale
+        image_source = source
+    }
+
+    function clear_tile() {
+        tile_source = ''
+    }
+
     function reset_rotation() {
         image_rotation = 0
     }
@@ -107,8 +130,40 @@ Flickable {
             fit_to_screen()
     }
 
-    onContentXChanged: console.debug('CX' + contentX)
-    onContentYChanged: console.debug('CY' + contentY)
+    onContentXChanged: {
+        console.debug('CX' + contentX)
+        request_tile()
+    }
+    onContentYChanged: {
+        console.debug('CY' + contentY)
+        request_tile()
+    }
+
+    function request_tile() {
+        if (tile_enabled)
+            tile_timer.restart()
+    }
+
+    // wait the view is still to request a tile
+    Timer {
+        id: tile_timer
+        interval: 250
+        onTriggered: {
+            if (image.status !== Image.Ready || image.scale <= 1) {
+                flickable.clear_tile()
+                return
+            }
+            // visible region in the image coordinates, rotation included
+            var p0 = image.mapFromItem(flickable, 0, 0)
+            var p1 = image.mapFromItem(flickable, flickable.width, flickable.height)
+            var x0 = Math.max(Math.min(p0.x, p1.x), 0) / image.width
+            var y0 = Math.max(Math.min(p0.y, p1.y), 0) / image.height
+            var x1 = Math.min(Math.max(p0.x, p1.x), image.width) / image.width
+            var y1 = Math.min(Math.max(p0.y, p1.y), image.height) / image.height
+            if (x1 > x0 && y1 > y0)
+                flickable.tile_requested(x0, y0, x1, y1, image.scale)
+        }
+    }
 
     Item {
         id: image_container // purpose ???
@@ -124,6 +179,12 @@ Flickable {
             transformOrigin: Item.Center
 
             property real prev_scale: 1.0
+            property real pending_source_scale: 1.0
+            property real source_scale: 1.0
+
+            // a preview is displayed at the size of the final image
+            width: implicitWidth * source_scale
+            height: implicitHeight * source_scale
 
             asynchronous: true
             cache: false
@@ -149,10 +210,12 @@ Flickable {
                     flickable.contentY = y_offset - flickable.height / 2
                 }
                 prev_scale = scale
+                flickable.request_tile()
             }
 
             onStatusChanged: {
                 if (status === Image.Ready) {
+                    source_scale = pending_source_scale
                     if (flickable.fit_to_screen_active)
                         flickable.fit_to_screen()
                     else if (flickable.full_zoom_active)
@@ -162,6 +225,20 @@ Flickable {
 
             onWidthChanged: console.debug(width)
             onHeightChanged: console.debug(height)
+
+            Image {
+                id: tile
+                // in the coordinates of the image, thus scaled and rotated with it
+                x: flickable.tile_region.x * image.width
+                y: flickable.tile_region.y * image.height
+                width: flickable.tile_region.width * image.width
+                height: flickable.tile_region.height * image.height
+                visible: flickable.tile_enabled && status === Image.Ready && image.scale > 1
+                asynchronous: true
+                cache: false
+                smooth: true
+                source: flickable.tile_source
+            }
         }
     }
 
@@ -0,0 +1,161 @@
+####################################################################################################
+#
+# Benchmark LruCache against an OrderedDict based implementation under concurrent load, then
+# compare the hit rates of the eviction policies for objects of mixed sizes
+#
+#   python dev/benchmark-lru-cache.py [NUMBER_OF_THREADS]
+#
+####################################################################################################
+
+from collections import OrderedDict
+import random
+import sys
+import threading
+import time
+
+from DatasheetExtractor.common.LruCache import Cache, GdsfPolicy, LfuPolicy, LruCache, LruPolicy
+
+####################################################################################################
+
+class OrderedDictLruCache:
+
+    """Reference implementation, without reference counters"""
+
+    ##############################################
+
+    def __init__(self, constraint: int) -> None:
+        self._constraint = constraint
+        self._cache_dict = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    ##############################################
+
+    def size(self) -> int:
+        return self._size
+
+    ##############################################
+
+    def add(self, obj, acquire: bool = False) -> None:
+        key = obj.key()
+        with self._lock:
+            old_obj = self._cache_dict.pop(key, None)
+            if old_obj is not None:
+                self._size -= old_obj.size()
+            self._cache_dict[key] = obj
+            self._size += obj.size()
+            while self._size > self._constraint and self._cache_dict:
+                _, old_obj = self._cache_dict.popitem(last=False)
+                self._size -= old_obj.size()
+
+    ##############################################
+
+    def get(self, key):
+        with self._lock:
+            obj = self._cache_dict.get(key)
+            if obj is not None:
+                self._cache_dict.move_to_end(key)
+            return obj
+
+####################################################################################################
+
+class Object:
+
+    def __init__(self, key: int, size: int) -> None:
+        self._key = key
+        self._size = size
+
+    def key(self) -> int:
+        return self._key
+
+    def size(self) -> int:
+        return self._size
+
+####################################################################################################
+
+NUMBER_OF_KEYS = 10_000
+NUMBER_OF_OPERATIONS = 200_000
+OBJECT_SIZE = 1024
+CONSTRAINT = NUMBER_OF_KEYS * OBJECT_SIZE // 10
+
+def worker(cache, seed: int, number_of_operations: int, statistics: list) -> None:
+    rng = random.Random(seed)
+    hits = 0
+    for _ in range(number_of_operations):
+        # skewed key distribution
+        key = int(rng.expovariate(1 / 2000)) % NUMBER_OF_KEYS
+        if cache.get(key) is not None:
+            hits += 1
+        else:
+            cache.add(Object(key, OBJECT_SIZE))
+    statistics.append(hits)
+
+def benchmark(cls, number_of_threads: int) -> None:
+    cache = cls(constraint=CONSTRAINT)
+    statistics = []
+    number_of_operations = NUMBER_OF_OPERATIONS // number_of_threads
+    threads = [
+        threading.Thread(target=worker, args=(cache, i, number_of_operations, statistics))
+        for i in range(number_of_threads)
+    ]
+    start = time.perf_counter()
+    for _ in threads:
+        _.start()
+    for _ in threads:
+        _.join()
+    duration = time.perf_counter() - start
+    hit_rate = sum(statistics) / (number_of_operations * number_of_threads)
+    operations_per_second = number_of_operations * number_of_threads / duration
+    assert cache.size() <= CONSTRAINT
+    print(
+        f'{cls.__name__:20} {number_of_threads:2} threads  '
+        f'{operations_per_second/1e3:7.1f} kop/s  hit rate {hit_rate:.2f}'
+    )
+
+####################################################################################################
+
+if len(sys.argv) > 1:
+    thread_counts = [int(sys.argv[1])]
+else:
+    thread_counts = (1, 4, 16)
+for number_of_threads in thread_counts:
+    for cls in (LruCache, OrderedDictLruCache):
+        benchmark(cls, number_of_threads)
+
+####################################################################################################
+
+# Pixmap like workload: many small thumbnails frequently reused and a few large renders
+MIXED_CONSTRAINT = 64 * 1024**2
+
+def mixed_workload(seed: int, number_of_operations: int) -> list[tuple[int, int]]:
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(number_of_operations):
+        page = int(rng.expovariate(1 / 50)) % 500
+        if rng.random() < .8:
+            requests.append((page, 40 * 1024))   # thumbnail
+        else:
+            requests.append((page + 1000, 25 * 1024**2))   # 300 dpi page
+    return requests
+
+def benchmark_policy(policy_cls, requests: list[tuple[int, int]]) -> None:
+    cache = Cache(constraint=MIXED_CONSTRAINT, policy=policy_cls())
+    hits = 0
+    byte_hits = 0
+    for key, size in requests:
+        if cache.get(key) is not None:
+            hits += 1
+            byte_hits += size
+        else:
+            cache.add(Object(key, size))
+    hit_rate = hits / len(requests)
+    byte_hit_rate = byte_hits / sum(_[1] for _ in requests)
+    print(
+        f'{policy_cls.NAME:5} hit rate {hit_rate:.2f}  byte hit rate {byte_hit_rate:.2f}  '
+        f'evictions {cache.number_of_evictions}'
+    )
+
+print()
+requests = mixed_workload(0, 100_000)
+for policy_cls in (LruPolicy, LfuPolicy, GdsfPolicy):
+    benchmark_policy(policy_cls, requests)
@@ -0,0 +1,115 @@
+####################################################################################################
+#
+# Benchmark PdfPage.sort_xy against the former pure Python implementation
+#
+#   python dev/benchmark-sort-xy.py DATASHEET.pdf [FIRST_PAGE LAST_PAGE]
+#
+####################################################################################################
+
+from pathlib import Path
+import sys
+import timeit
+
+from DatasheetExtractor import PdfDocument, PdfPage
+from DatasheetExtractor.backend.pdf.page import Direction
+from IntervalArithmetic import IntervalInt2D
+
+####################################################################################################
+
+def sort_xy_python(
+        page: PdfPage,
+        axe: str = 'x',
+        use_center1: bool = False,
+        use_center2: bool = False,
+        ensure_direction: bool = False,
+        round_scale: int = 10,
+        bounding_box=None,
+) -> list:
+    axe_map = {}
+    for line in page.lines:
+        if bounding_box is not None:
+            if not line.bbox.is_included_in(bounding_box):
+                continue
+        if isinstance(ensure_direction, bool):
+            if axe == 'x' and line.direction != Direction.vertical:
+                continue
+            if axe == 'y' and line.direction != Direction.horizontal:
+                continue
+        elif ensure_direction is not None:
+            if line.direction != ensure_direction:
+                continue
+        if use_center1:
+            x = line.center_x if axe == 'x' else line.center_y
+        else:
+            x = line.x if axe == 'x' else line.y
+        x = page.round(x, round_scale)
+        axe_map.setdefault(x, [])
+        axe_map[x].append(line)
+    for line in axe_map.values():
+        def func(_):
+            if use_center2:
+                return _.center_x if axe == 'y' else _.center_y
+            else:
+                return _.x if axe == 'y' else _.y
+        line.sort(key=func)
+    return [axe_map[i] for i in sorted(axe_map.keys())]
+
+####################################################################################################
+
+def to_indexes(groups: list) -> list:
+    return [[_.index for _ in group] for group in groups]
+
+####################################################################################################
+
+path = Path(sys.argv[1])
+document = PdfDocument(path)
+if len(sys.argv) > 3:
+    first_page, last_page = [int(_) for _ in sys.argv[2:4]]
+else:
+    first_page, last_page = document.first_page_number, document.last_page_number
+pages = [document[_] for _ in range(first_page, last_page + 1)]
+for page in pages:
+    # exclude text extraction from timings
+    page.span_table()
+
+CASES = (
+    dict(axe='x', ensure_direction=True),
+    dict(axe='y', ensure_direction=True),
+    dict(axe='y', use_center1=True, use_center2=True, ensure_direction=Direction.horizontal),
+    dict(axe='y', ensure_direction=None, round_scale=100),
+    dict(axe='x', ensure_direction=False),
+    dict(axe='y', ensure_direction=True, bounding_box='top half'),
+)
+
+def resolve(page: PdfPage, kwargs: dict) -> dict:
+    if kwargs.get('bounding_box') == 'top half':
+        # page width and height are already in scaled unit as span_index
+        kwargs = dict(kwargs, bounding_box=IntervalInt2D((0, page.width), (0, page.height // 2)))
+    return kwargs
+
+def reference_kwargs(kwargs: dict) -> dict:
+    # Expected difference: sort_xy(ensure_direction=False) no longer filters on the direction,
+    #   the former implementation filtered as True
+    if kwargs.get('ensure_direction') is False:
+        return dict(kwargs, ensure_direction=None)
+    return kwargs
+
+NUMBER = 10
+for kwargs in CASES:
+    page_kwargs = [resolve(_, kwargs) for _ in pages]
+    number_of_spans = 0
+    for page, kwargs_ in zip(pages, page_kwargs):
+        groups = to_indexes(page.sort_xy(**kwargs_))
+        assert groups == to_indexes(sort_xy_python(page, **reference_kwargs(kwargs_))), (page, kwargs)
+        number_of_spans += sum(len(_) for _ in groups)
+    python_time = timeit.timeit(
+        lambda: [sort_xy_python(page, **reference_kwargs(_)) for page, _ in zip(pages, page_kwargs)],
+        number=NUMBER,
+    )
+    numpy_time = timeit.timeit(lambda: [page.sort_xy(**_) for page, _ in zip(pages, page_kwargs)], number=NUMBER)
+    print(kwargs, f'{number_of_spans} spans')
+    print(f'  python {python_time/NUMBER*1e3:8.2f} ms')
+    print(f'  sort_xy {numpy_time/NUMBER*1e3:7.2f} ms  x{python_time/numpy_time:.1f}')
+    if 'bounding_box' not in kwargs:
+        bucket_time = timeit.timeit(lambda: [_.span_table().bucket(**kwargs) for _ in pages], number=NUMBER)
+        print(f'  bucket {bucket_time/NUMBER*1e3:8.2f} ms  x{python_time/bucket_time:.1f}')
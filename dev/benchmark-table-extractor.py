@@ -0,0 +1,88 @@
+####################################################################################################
+#
+# Benchmark MupdfTableExtractor against TabulaExtractor on the datasheets of the devices
+#
+#   python dev/benchmark-table-extractor.py [DEVICE.yaml|DATASHEET.pdf ...] [--pages FIRST LAST]
+#
+# Datasheets are downloaded to the current directory.  Tabula is skipped if tabula-py or Java is not
+# available.
+#
+####################################################################################################
+
+from pathlib import Path
+import argparse
+import time
+
+from yaml import load
+try:
+    from yaml import CLoader as Loader
+except ImportError:
+    from yaml import Loader
+
+from DatasheetExtractor import PdfDocument
+from DatasheetExtractor.backend.extractor.mupdf_table import MupdfTableExtractor
+try:
+    from DatasheetExtractor.backend.extractor.tabula import TabulaExtractor
+except ImportError as exception:
+    print(f'Tabula comparison is skipped: {exception}')
+    TabulaExtractor = None
+
+####################################################################################################
+
+parser = argparse.ArgumentParser()
+parser.add_argument('paths', nargs='*', default=sorted(Path('devices').glob('*.yaml')))
+parser.add_argument('--pages', nargs=2, type=int)
+args = parser.parse_args()
+
+####################################################################################################
+
+def open_document(path: Path) -> PdfDocument:
+    path = Path(path)
+    if path.suffix == '.yaml':
+        with open(path) as fh:
+            data = load(fh, Loader=Loader)
+        return PdfDocument(data['datasheet url'])
+    return PdfDocument(path)
+
+####################################################################################################
+
+def shapes(tables: list) -> list[tuple[int, int]]:
+    return [_.shape for _ in tables]
+
+def run(extractor, pages: range, lattice: bool) -> tuple[float, dict]:
+    results = {}
+    start = time.perf_counter()
+    for page_number in pages:
+        results[page_number] = shapes(extractor.extract(page_number, guess=True, lattice=lattice))
+    return time.perf_counter() - start, results
+
+####################################################################################################
+
+for path in args.paths:
+    document = open_document(path)
+    if args.pages:
+        pages = range(args.pages[0], args.pages[1] + 1)
+    else:
+        pages = range(document.first_page_number, document.last_page_number + 1)
+    print(f'{path}: {len(pages)} pages')
+    extractors = [MupdfTableExtractor(document)]
+    if TabulaExtractor is not None:
+        extractors.append(TabulaExtractor(document.path))
+    for lattice in (True, False):
+        mode = 'lattice' if lattice else 'stream'
+        results = []
+        for extractor in extractors:
+            try:
+                duration, shapes_ = run(extractor, pages, lattice)
+            except Exception as exception:
+                print(f'  {extractor.__class__.__name__:20} {mode:7} failed: {exception}')
+                continue
+            number_of_tables = sum(len(_) for _ in shapes_.values())
+            print(
+                f'  {extractor.__class__.__name__:20} {mode:7} {duration:7.2f} s  '
+                f'{duration/len(pages)*1e3:7.1f} ms/page  {number_of_tables} tables'
+            )
+            results.append(shapes_)
+        if len(results) == 2:
+            same = sum(results[0][_] == results[1][_] for _ in pages)
+            print(f'  same table shapes on {same}/{len(pages)} pages')
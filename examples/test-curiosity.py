@@ -17,8 +17,6 @@ from DatasheetExtractor import PdfDocument, PdfPage
 from DatasheetExtractor.backend.pdf.page import Direction
 from DatasheetExtractor.backend.extractor.pinout import PinoutExtractor
 
-from rtree import index
-
 ####################################################################################################
 
 url = 'http://ww1.microchip.com/downloads/en/DeviceDoc/AVR128DA48-Curiosity-Nano-UG-DS50002971A.pdf'
@@ -35,15 +33,15 @@ page = document[page_number]
 page_width = page.width
 legend_box = page.percent_bbox((60, 80), (30, 38))
 pinout_box = page.percent_bbox((18, 91), (38, 77))
+# in scaled unit for spatial indexes
+legend_box_scaled = page.percent_bbox((60, 80), (30, 38), round_scale=1)
 
 # extractor = PinoutExtractor(document[page])
 # print()
 # print(extractor.format_pinout(extractor.extract_pinout()))
 
-box_index = index.Index()
-for i, _ in enumerate(page.color_boxes()):
-    # obj=_
-    box_index.insert(i, _.bounding_box)
+legend_boxes = page.boxes_contained_in(legend_box_scaled)
+print(f'{len(legend_boxes)} boxes in legend')
 
 for y in page.sort_xy(
         axe='y',
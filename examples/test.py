@@ -23,7 +23,7 @@ path = Path('.', 'devices', 'AVR128DA28-32-48-64-Data-Sheet-40002183C.pdf')
 url = path
 print(url)
 
-document = PdfDocument(url, cache_path='devices')
+document = PdfDocument(url, cache_path='devices', text_cache=True)
 
 ####################################################################################################
 
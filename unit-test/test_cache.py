@@ -0,0 +1,140 @@
+####################################################################################################
+#
+# DatasheetExtractor - A Python library to extract data from datasheet
+# Copyright (C) 2022 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+from DatasheetExtractor.common.LruCache import Cache, GdsfPolicy, LfuPolicy, LruCache, LruPolicy
+
+####################################################################################################
+
+class Object:
+
+    def __init__(self, key: str, size: int = 1, cost: int = None) -> None:
+        self._key = key
+        self._size = size
+        if cost is not None:
+            self.cost = lambda: cost
+
+    def key(self) -> str:
+        return self._key
+
+    def size(self) -> int:
+        return self._size
+
+####################################################################################################
+
+def keys(cache: Cache) -> list[str]:
+    """Return the keys from the last to the first to be evicted"""
+    return [_.key for _ in cache]
+
+####################################################################################################
+
+def test_lru_eviction_order():
+    cache = LruCache(constraint=3)
+    assert isinstance(cache.policy, LruPolicy)
+    for key in 'abc':
+        cache.add(Object(key))
+    assert keys(cache) == ['c', 'b', 'a']
+    cache.get('a')
+    assert keys(cache) == ['a', 'c', 'b']
+    cache.add(Object('d'))
+    assert keys(cache) == ['d', 'a', 'c']
+    assert cache.number_of_evictions == 1
+
+def test_lru_pinned_element():
+    cache = LruCache(constraint=2)
+    cache.add(Object('a'), acquire=True)
+    cache.add(Object('b'))
+    cache.add(Object('c'))
+    # a is acquired, b is evicted instead
+    assert 'a' in cache and 'b' not in cache
+    cache.release('a')
+    cache.add(Object('d'))
+    assert keys(cache) == ['d', 'c']
+
+def test_update_size():
+    cache = LruCache(constraint=10)
+    big = Object('big', 2)
+    cache.add(big)
+    cache.add(Object('small', 2))
+    assert cache.size() == 4
+    big._size = 9
+    cache.update('big')
+    # the update is not an access, the least recently used element is evicted
+    assert keys(cache) == ['small']
+    assert cache.size() == 2
+
+####################################################################################################
+
+def test_lfu_eviction_order():
+    cache = Cache(constraint=3, policy=LfuPolicy())
+    for key in 'abc':
+        cache.add(Object(key))
+    for _ in range(2):
+        cache.get('a')
+    cache.get('b')
+    assert keys(cache) == ['a', 'b', 'c']
+    # d and c have the same frequency, the oldest is evicted
+    cache.add(Object('d'))
+    assert keys(cache) == ['a', 'b', 'd']
+    cache.add(Object('e'))
+    assert keys(cache) == ['a', 'b', 'e']
+
+####################################################################################################
+
+def test_gdsf_eviction_order():
+    cache = Cache(constraint=10, policy=GdsfPolicy())
+    # priorities are frequency / size
+    cache.add(Object('large', 5))
+    cache.add(Object('small', 1))
+    cache.add(Object('medium', 2))
+    assert keys(cache) == ['small', 'medium', 'large']
+    cache.add(Object('new', 3))
+    # the large element has the lowest priority
+    assert keys(cache) == ['small', 'medium', 'new']
+    # the priority of the evicted element, 0.2, inflates the new ones, thus large now has a higher
+    # priority than new, 0.4 versus 0.33
+    cache.add(Object('large', 5))
+    assert keys(cache) == ['small', 'medium', 'large']
+
+def test_gdsf_aging():
+    cache = Cache(constraint=4, policy=GdsfPolicy())
+    cache.add(Object('old', 2))
+    for _ in range(3):
+        cache.get('old')
+    cache.add(Object('a', 2))
+    # old has the priority 2, a 0.5
+    cache.add(Object('b', 2))
+    assert keys(cache) == ['old', 'b']
+    # the priority of the evicted element, 0.5, inflates the new ones, but a frequent element
+    # having a higher priority is kept until the inflation exceeds it
+    for i in range(3):
+        cache.add(Object(f'c{i}', 2))
+    assert 'old' in cache
+    for i in range(3, 8):
+        cache.add(Object(f'c{i}', 2))
+    assert 'old' not in cache
+
+def test_gdsf_cost():
+    cache = Cache(constraint=2, policy=GdsfPolicy())
+    cache.add(Object('expensive', cost=10))
+    cache.add(Object('cheap'))
+    cache.add(Object('new'))
+    assert keys(cache) == ['expensive', 'new']
@@ -0,0 +1,113 @@
+####################################################################################################
+#
+# DatasheetExtractor - A Python library to extract data from datasheet
+# Copyright (C) 2022 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+####################################################################################################
+
+import pytest
+
+import fitz
+
+from IntervalArithmetic import IntervalInt2D
+
+from DatasheetExtractor.backend.pdf.page import Direction, PdfPage, SpanTable
+
+####################################################################################################
+
+@pytest.fixture(scope='module')
+def table():
+    """Return the span table of a page having aligned columns, rows and vertical texts"""
+    document = fitz.open()
+    page = document.new_page()
+    for row, y in enumerate((100, 120, 121, 140, 300)):
+        for column, x in enumerate((50, 150, 152, 250)):
+            page.insert_text((x, y), f'{row}{column}', fontsize=9)
+    for x, y in ((400, 500), (404, 600), (450, 500)):
+        page.insert_text((x, y), 'vertical', fontsize=9, rotate=90)
+    text = page.get_text('dict', sort=True)
+    return SpanTable.from_text_dict(text, PdfPage.UNIT_SCALE)
+
+####################################################################################################
+
+def bucket_python(
+        table: SpanTable,
+        axe: str = 'x',
+        use_center1: bool = False,
+        use_center2: bool = False,
+        ensure_direction: bool = False,
+        round_scale: int = 10,
+        bounding_box: IntervalInt2D = None,
+) -> list:
+    # former PdfPage.sort_xy implementation
+    axe_map = {}
+    for line in table:
+        if bounding_box is not None:
+            if not line.bbox.is_included_in(bounding_box):
+                continue
+        if isinstance(ensure_direction, bool):
+            if axe == 'x' and line.direction != Direction.vertical:
+                continue
+            if axe == 'y' and line.direction != Direction.horizontal:
+                continue
+        elif ensure_direction is not None:
+            if line.direction != ensure_direction:
+                continue
+        if use_center1:
+            x = line.center_x if axe == 'x' else line.center_y
+        else:
+            x = line.x if axe == 'x' else line.y
+        x = PdfPage.round(x, round_scale)
+        axe_map.setdefault(x, [])
+        axe_map[x].append(line)
+    for line in axe_map.values():
+        def func(_):
+            if use_center2:
+                return _.center_x if axe == 'y' else _.center_y
+            else:
+                return _.x if axe == 'y' else _.y
+        line.sort(key=func)
+    return [[_.index for _ in axe_map[i]] for i in sorted(axe_map.keys())]
+
+####################################################################################################
+
+@pytest.mark.parametrize('kwargs', (
+    dict(axe='x', ensure_direction=True),
+    dict(axe='y', ensure_direction=True),
+    dict(axe='y', ensure_direction=True, round_scale=100),
+    dict(axe='y', use_center1=True, use_center2=True, ensure_direction=Direction.horizontal),
+    dict(axe='x', use_center1=True, ensure_direction=Direction.vertical),
+    dict(axe='x', ensure_direction=None, round_scale=50),
+))
+def test_bucket(table, kwargs):
+    groups = [_.tolist() for _ in table.bucket(**kwargs)]
+    assert groups
+    assert groups == bucket_python(table, **kwargs)
+
+def test_bucket_without_direction(table):
+    # the former implementation filtered ensure_direction=False as True
+    groups = [_.tolist() for _ in table.bucket(axe='y', ensure_direction=False)]
+    assert groups == bucket_python(table, axe='y', ensure_direction=None)
+    assert sum(len(_) for _ in groups) == len(table)
+
+def test_bucket_indexes(table):
+    bounding_box = IntervalInt2D((0, 2000), (0, 1300))
+    indexes = [_.index for _ in table if _.bbox.is_included_in(bounding_box)]
+    assert 0 < len(indexes) < len(table)
+    groups = [_.tolist() for _ in table.bucket(axe='y', ensure_direction=True, indexes=indexes[::-1])]
+    assert groups == bucket_python(table, axe='y', ensure_direction=True, bounding_box=bounding_box)
@@ -0,0 +1,86 @@
+####################################################################################################
+#
+# DatasheetExtractor - A Python library to extract data from datasheet
+# Copyright (C) 2022 Fabrice Salvaire
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+####################################################################################################
+
+
+####################################################################################################
+
+import shutil
+
+import pytest
+
+import fitz
+
+####################################################################################################
+
+tabula = pytest.importorskip('tabula')
+pytest.importorskip('jpype')
+if shutil.which('java') is None:
+    pytest.skip('Java is not available', allow_module_level=True)
+
+from DatasheetExtractor.backend.extractor.tabula import TabulaExtractor
+
+####################################################################################################
+
+@pytest.fixture
+def lattice_pdf(tmp_path):
+    """Write a page with two ruled tables and a paragraph between them"""
+    document = fitz.open()
+    page = document.new_page()
+    def draw_table(x0: float, y0: float, data: tuple) -> None:
+        xs = [x0 + 100*i for i in range(len(data[0]) + 1)]
+        ys = [y0 + 20*i for i in range(len(data) + 1)]
+        for x in xs:
+            page.draw_line((x, ys[0]), (x, ys[-1]))
+        for y in ys:
+            page.draw_line((xs[0], y), (xs[-1], y))
+        for row, texts in enumerate(data):
+            for column, text in enumerate(texts):
+                page.insert_text((xs[column] + 3, ys[row] + 14), text, fontsize=9)
+    draw_table(50, 100, (
+        ('Symbol', 'Min', 'Max'),
+        ('VCC', '1.8', '5.5'),
+        ('T', '-40', '85'),
+    ))
+    for i in range(10):
+        page.insert_text((50, 200 + 12*i), 'A paragraph describing the electrical characteristics.', fontsize=8)
+    draw_table(50, 400, (
+        ('Pin', 'Name'),
+        ('1', 'VCC'),
+        ('2', 'GND'),
+    ))
+    path = tmp_path.joinpath('lattice.pdf')
+    document.save(path)
+    return path
+
+####################################################################################################
+
+@pytest.mark.parametrize('guess', (True, False))
+def test_backends_match_on_lattice_page(lattice_pdf, guess):
+    jvm_extractor = TabulaExtractor(lattice_pdf, persistent=True)
+    cli_extractor = TabulaExtractor(lattice_pdf, persistent=False)
+    try:
+        jvm_tables = jvm_extractor.extract(1, guess=guess, lattice=True)
+    finally:
+        jvm_extractor.close()
+    cli_tables = cli_extractor.extract(1, guess=guess, lattice=True)
+    assert len(jvm_tables) == len(cli_tables) == 2
+    for jvm_table, cli_table in zip(jvm_tables, cli_tables):
+        assert jvm_table.equals(cli_table)
+    assert list(jvm_tables[0].columns) == ['Symbol', 'Min', 'Max']